@@ -4,172 +4,586 @@
 
 @author: ryanhuang
 uni: rh3129
+
+The search runs on a bitboard: the 16 cells are nibbles of one int holding
+log2 of the tile (0 for empty), cell (x, y) at bits 4 * (4 * x + y), so row
+x is the 16 bits at 16 * x. Moves and the heuristic are lookups in tables
+indexed by a 16-bit row, and up / down reuse the row tables on the
+transposed board.
 """
 
-import math
 import time
 import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
 from BaseAI import BaseAI
 
+UP, DOWN, LEFT, RIGHT = range(4)
+ROW_MASK = 0xFFFF
+
+# Heuristic weights
+WEIGHT_EMPTY = 0.6
+WEIGHT_MONO = 0.13
+WEIGHT_MERGE = 0.27
+
+
+def _row_cells(row):
+    return [(row >> (4 * i)) & 0xF for i in range(4)]
+
+
+def _cells_row(cells):
+    return cells[0] | cells[1] << 4 | cells[2] << 8 | cells[3] << 12
+
+
+def _slide_left(cells):
+    """slide a row towards index 0, merging each pair of equal tiles once"""
+    tiles = [c for c in cells if c]
+    merged = []
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            merged.append(min(tiles[i] + 1, 0xF))
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+    return merged + [0] * (4 - len(merged))
+
+
+def _dot(cells, weights):
+    return sum(c * w for c, w in zip(cells, weights))
+
+
+# Row tables: every 16-bit row maps to its left and right move and its heuristic parts
+MOVE_LEFT = [0] * 65536
+MOVE_RIGHT = [0] * 65536
+EMPTY = [0] * 65536
+MERGES = [0] * 65536
+# the four monotonicity corners weight the row or column through the corner 8, 4, 2, 1
+# and the three cells leading away from it along the other edge 4, 2, 1
+MONO_TOWARDS_0 = [0] * 65536   # 8, 4, 2, 1
+MONO_TOWARDS_3 = [0] * 65536   # 1, 2, 4, 8
+MONO_TAIL_0 = [0] * 65536      # 0, 4, 2, 1
+MONO_TAIL_3 = [0] * 65536      # 1, 2, 4, 0
+
+for _row in range(65536):
+    _cells = _row_cells(_row)
+    MOVE_LEFT[_row] = _cells_row(_slide_left(_cells))
+    MOVE_RIGHT[_row] = _cells_row(_slide_left(_cells[::-1])[::-1])
+    EMPTY[_row] = _cells.count(0)
+    MERGES[_row] = sum(1 for i in range(3) if _cells[i] and _cells[i] == _cells[i + 1])
+    MONO_TOWARDS_0[_row] = _dot(_cells, (8, 4, 2, 1))
+    MONO_TOWARDS_3[_row] = _dot(_cells, (1, 2, 4, 8))
+    MONO_TAIL_0[_row] = _dot(_cells, (0, 4, 2, 1))
+    MONO_TAIL_3[_row] = _dot(_cells, (1, 2, 4, 0))
+del _row, _cells
+
+
+def transpose(board):
+    """swap cell (x, y) with (y, x), so columns become rows"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _move_rows(board, table):
+    return (table[board & ROW_MASK] | table[(board >> 16) & ROW_MASK] << 16 |
+            table[(board >> 32) & ROW_MASK] << 32 | table[(board >> 48) & ROW_MASK] << 48)
+
+
+def move_board(board, move):
+    """the board after a move, equal to board when the move changes nothing"""
+    if move == LEFT:
+        return _move_rows(board, MOVE_LEFT)
+    if move == RIGHT:
+        return _move_rows(board, MOVE_RIGHT)
+    # up is towards x = 0, which is left on the transposed board
+    return transpose(_move_rows(transpose(board), MOVE_LEFT if move == UP else MOVE_RIGHT))
+
+
+def empty_cells(board):
+    """nibble indices of the empty cells"""
+    return [i for i in range(16) if not (board >> (4 * i)) & 0xF]
+
+
+def encode_grid(grid):
+    board = 0
+    for x in range(4):
+        for y in range(4):
+            value = grid.map[x][y]
+            if value:
+                board |= (value.bit_length() - 1) << (4 * (4 * x + y))
+    return board
+
+
+def heuristic(board):
+    """
+    0.13 * best corner monotonicity + 0.6 * empty cells + 0.27 * adjacent equal
+    pairs, summed from the row tables over the rows and the transposed rows
+    """
+    t = transpose(board)
+    rows = (board & ROW_MASK, (board >> 16) & ROW_MASK, (board >> 32) & ROW_MASK, board >> 48)
+    cols = (t & ROW_MASK, (t >> 16) & ROW_MASK, (t >> 32) & ROW_MASK, t >> 48)
+    empty = EMPTY[rows[0]] + EMPTY[rows[1]] + EMPTY[rows[2]] + EMPTY[rows[3]]
+    merges = (MERGES[rows[0]] + MERGES[rows[1]] + MERGES[rows[2]] + MERGES[rows[3]] +
+              MERGES[cols[0]] + MERGES[cols[1]] + MERGES[cols[2]] + MERGES[cols[3]])
+    monotonicity = max(MONO_TOWARDS_0[rows[0]] + MONO_TAIL_0[cols[0]],
+                       MONO_TOWARDS_3[rows[0]] + MONO_TAIL_0[cols[3]],
+                       MONO_TAIL_3[cols[0]] + MONO_TOWARDS_0[rows[3]],
+                       MONO_TAIL_3[cols[3]] + MONO_TOWARDS_3[rows[3]])
+    return WEIGHT_MONO * monotonicity + WEIGHT_EMPTY * empty + WEIGHT_MERGE * merges
+
+
+# Transposition table keys are board << 2 | node type, so both search modes can share one table
+MAX_NODE, MIN_NODE, EXPECT_MAX_NODE, CHANCE_NODE = range(4)
+
+# tile spawns as (nibble, probability): a 2 nine times in ten, otherwise a 4
+SPAWNS = ((1, 0.9), (2, 0.1))
+
+# Transposition table entry bounds: the stored value is exact, at least or at most the true value
+EXACT, LOWER, UPPER = range(3)
+
+
+class TranspositionTable(object):
+    """
+    A fixed number of slots indexed by a multiplicative hash of the key.
+    Each slot holds a board, node type, depth, bound, value, move and age,
+    where depth is how many plies were searched below the position and age
+    is the move it was stored in. The fields live in flat typed arrays, so
+    the table adds no objects for the garbage collector to walk. A slot is
+    taken over by a search at least as deep, or by anything once its entry
+    is from an earlier move, so entries survive between moves but stale
+    shallow ones are recycled first.
+    """
+
+    def __init__(self, bits=20):
+        slots = 1 << bits
+        self.shift = 64 - bits
+        self.boards = array('Q', bytes(8 * slots))
+        # node type of the entry, -1 for an empty slot
+        self.kinds = array('b', [-1]) * slots
+        self.depths = array('b', bytes(slots))
+        self.bounds = array('b', bytes(slots))
+        self.values = array('d', bytes(8 * slots))
+        # best move, -1 for none
+        self.moves = array('b', bytes(slots))
+        self.ages = array('l', bytes(array('l').itemsize * slots))
+        self.age = 0
+        self.probes = self.hits = self.cutoffs = 0
+        self.stores = self.replaced = self.rejected = 0
+
+    def index(self, key):
+        return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+
+    def probe(self, key):
+        """(depth, bound, value, move) stored for key, or None"""
+        self.probes += 1
+        index = self.index(key)
+        if self.kinds[index] == key & 3 and self.boards[index] == key >> 2:
+            self.hits += 1
+            move = self.moves[index]
+            return self.depths[index], self.bounds[index], self.values[index], None if move < 0 else move
+        return None
+
+    def store(self, key, depth, bound, value, move):
+        index = self.index(key)
+        kind, board = key & 3, key >> 2
+        if self.kinds[index] >= 0 and (self.kinds[index] != kind or self.boards[index] != board):
+            if self.ages[index] == self.age and self.depths[index] > depth:
+                self.rejected += 1
+                return
+            self.replaced += 1
+        self.stores += 1
+        self.boards[index] = board
+        self.kinds[index] = kind
+        self.depths[index] = depth
+        self.bounds[index] = bound
+        self.values[index] = value
+        self.moves[index] = -1 if move is None else move
+        self.ages[index] = self.age
+
+    def newMove(self):
+        self.age += 1
+
+    def counters(self):
+        return {name: getattr(self, name) for name in TABLE_COUNTERS}
+
+    def stats(self):
+        return table_stats(self.counters())
+
+
+# counters every transposition table keeps, summed over the workers in parallel mode
+TABLE_COUNTERS = ("probes", "hits", "cutoffs", "stores", "replaced", "rejected")
+
+
+def table_stats(counters):
+    stats = dict(counters)
+    stats["hitRate"] = counters["hits"] / counters["probes"] if counters["probes"] else 0.0
+    return stats
+
+
+class SearchTimeout(Exception):
+    """raised inside the search once the move's time budget is spent"""
+
+
 class IntelligentAgent(BaseAI):
-    
-    def __init__(self):
-        self.maxDepth = 5
+
+    def __init__(self, workers=0):
+        # "expectimax" averages over tile spawns, "minimax" takes the worst spawn with alpha-beta
+        self.mode = "expectimax"
+        # getMove deepens two plies at a time until timeLimit runs out, these are only safety
+        # bounds for boards whose whole tree is searched early, kept within the table's 8-bit depths
+        self.maxDepth = 31
+        self.expectDepth = 31
         self.timeLimit = 0.18
+        # the clock is read once every checkStride nodes
+        self.checkStride = 256
+        self.clock = time.process_time
+        # with more than one worker the root moves are searched in a process pool, started
+        # and warmed up here or by startPool() with the settings of that moment, kept until close()
+        self.workers = workers
+        self.pool = None
+        # workers stop this long before the deadline so their results arrive in time
+        self.dispatchMargin = 0.01
+        # chance branches reached with a lower probability are scored by the heuristic
+        self.probThreshold = 0.0001
+        # chance nodes with more empty cells than this average over a random sample of them
+        self.chanceSamples = 6
+        # kept for the whole game, in parallel mode only the workers search and keep one
+        self.table = TranspositionTable() if workers <= 1 else None
+        # table counters reported back by the workers
+        self.workerCounters = dict.fromkeys(TABLE_COUNTERS, 0)
         super(IntelligentAgent, self).__init__()
-        
+        if self.workers > 1:
+            self.startPool()
+
     def getMove(self, grid):
-        self.startTime = time.process_time()
-        move, _ = self.maximize(grid, float('-inf'), float('inf'), 0)
-        return move 
-
-    
-    def minimize(self, state, alpha, beta, depth=0):
-        if self.terminal(state) or time.process_time() - self.startTime > self.timeLimit or depth >= self.maxDepth:
-            return None, self.h(state)
-        
+        """
+        Iterative deepening: search the root moves one move and spawn deeper
+        each round, best first by the last round's scores, and play the
+        best move of the deepest round that finished within timeLimit.
+        """
+        self.deadline = self.clock() + self.timeLimit
+        self.nodes = 0
+        self.completedDepth = 0
+        board = encode_grid(grid)
+        moves = [(move, move_board(board, move)) for move in (UP, DOWN, LEFT, RIGHT)]
+        moves = [(move, newBoard) for move, newBoard in moves if newBoard != board]
+        if not moves:
+            return None
+        if self.workers > 1:
+            return self.parallelMove(moves)
+        if self.table is None:
+            self.table = TranspositionTable()
+        self.table.newMove()
+
+        bestMove = moves[0][0]
+        maxDepth = self.expectDepth if self.mode == "expectimax" else self.maxDepth
+        self.depthLimit = 1
+        try:
+            while self.depthLimit <= maxDepth:
+                scores = self.searchRoot(moves)
+                moves.sort(key=lambda item: scores[item[0]], reverse=True)
+                bestMove = moves[0][0]
+                self.completedDepth = self.depthLimit
+                self.depthLimit += 2
+        except SearchTimeout:
+            pass
+        return bestMove
+
+    def searchRoot(self, moves):
+        """the score of each root move (move, board after it) searched to depthLimit"""
+        scores = {}
+        alpha = float('-inf')
+        for move, newBoard in moves:
+            if self.mode == "expectimax":
+                scores[move], _ = self.chance(newBoard, 1.0, 1)
+            else:
+                # moves after the first only need to show they are no better
+                _, scores[move] = self.minimize(newBoard, alpha, float('inf'), 1)
+                alpha = max(alpha, scores[move])
+        return scores
+
+    def startPool(self):
+        """start the worker processes and wait until every one has run its initializer"""
+        if self.pool is not None:
+            return
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(self.mode, self.probThreshold,
+                                                  self.chanceSamples, self.checkStride))
+        wait([self.pool.submit(_warm_up) for _ in range(self.workers)])
+
+    def parallelMove(self, moves):
+        """
+        Split the root moves between the workers, at most one share per
+        worker so every share starts at once. Each worker deepens all its
+        moves together until a shared wall-clock deadline, and the agent
+        plays the best move at the deepest depth every move finished.
+        Each worker keeps its own transposition table.
+        """
+        # a pool started here makes this first move pay for the start-up
+        self.startPool()
+        # process time does not advance while waiting, so the pool runs on the wall clock
+        deadline = time.monotonic() + self.timeLimit
+        maxDepth = self.expectDepth if self.mode == "expectimax" else self.maxDepth
+        shares = min(self.workers, len(moves))
+        futures = [self.pool.submit(search_root_moves, moves[i::shares], maxDepth, deadline - self.dispatchMargin)
+                   for i in range(shares)]
+        done, notDone = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        # a share still queued must not eat into the next move, a running one stops at its own deadline
+        for future in notDone:
+            future.cancel()
+        scores = {}
+        for future in done:
+            shareScores, counters = future.result()
+            scores.update(shareScores)
+            for name in TABLE_COUNTERS:
+                self.workerCounters[name] += counters[name]
+
+        # a move whose worker did not get to it in time is left out
+        finished = [move for move, _ in moves if scores.get(move)]
+        if not finished:
+            return moves[0][0]
+        rounds = min(len(scores[move]) for move in finished)
+        self.completedDepth = 2 * rounds - 1
+        return max(finished, key=lambda move: scores[move][rounds - 1])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def tick(self):
+        self.nodes += 1
+        if not self.nodes % self.checkStride and self.clock() >= self.deadline:
+            raise SearchTimeout()
+
+    def tableStats(self):
+        """transposition table counters, summed over the shares the workers returned in parallel mode"""
+        if self.workers > 1:
+            return table_stats(self.workerCounters)
+        return self.table.stats()
+
+    def lookup(self, key, depth, alpha, beta):
+        """a stored (move, value) searched at least as deep that settles this window, or None"""
+        entry = self.table.probe(key)
+        if entry is None or entry[0] < self.depthLimit - depth:
+            return None
+        bound, value = entry[1], entry[2]
+        if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+            self.table.cutoffs += 1
+            return entry[3], value
+        return None
+
+    def remember(self, key, depth, alpha, beta, move, value):
+        bound = UPPER if value <= alpha else LOWER if value >= beta else EXACT
+        self.table.store(key, self.depthLimit - depth, bound, value, move)
+
+
+    def minimize(self, board, alpha, beta, depth=0):
+        self.tick()
+        if self.terminal(board) or depth >= self.depthLimit:
+            return None, heuristic(board)
+
+        key = board << 2 | MIN_NODE
+        stored = self.lookup(key, depth, alpha, beta)
+        if stored is not None:
+            return stored
+        alphaOrig, betaOrig = alpha, beta
         minChild = None
         minUtility = float('inf')
-        possibleTiles = state.getAvailableCells();
-        
-        for tile in possibleTiles:
-            # call maximize twice, state with 2 added and state with 4 added
+
+        for cell in empty_cells(board):
+            # call maximize twice, board with 2 added and board with 4 added
             # this will return two utilty values so take the weighted avg of these 2
             # the weights are 0.9 and 0.1
-            stateWithTwo = state.clone()
-            stateWithTwo.insertTile(tile, 2)
-            _, utility2 = self.maximize(stateWithTwo, alpha, beta, depth + 1)
-            
-            stateWithFour = state.clone()
-            stateWithFour.insertTile(tile, 4)
-            _, utility4 = self.maximize(stateWithFour, alpha, beta, depth + 1)
-
-            if time.process_time() - self.startTime >= self.timeLimit:
-                break
-            
+            _, utility2 = self.maximize(board | 1 << (4 * cell), alpha, beta, depth + 1)
+            _, utility4 = self.maximize(board | 2 << (4 * cell), alpha, beta, depth + 1)
+
             avgUtil = 0.9 * utility2 + 0.1 * utility4
-            
+
             #check if util is min util so far
             if avgUtil < minUtility:
                 minUtility = avgUtil
-                minChild = tile
-            
+                minChild = cell
+
             if minUtility <= alpha:
                 break
-            
+
             if minUtility < beta:
                 beta = minUtility
-        
+
+        self.remember(key, depth, alphaOrig, betaOrig, minChild, minUtility)
         return minChild, minUtility
-    
-    def maximize(self, state, alpha, beta, depth=0):
-        if self.terminal(state) or time.process_time() - self.startTime > self.timeLimit or depth >= self.maxDepth:
-            return None, self.h(state)
-        
+
+    def maximize(self, board, alpha, beta, depth=0):
+        self.tick()
+        if self.terminal(board) or depth >= self.depthLimit:
+            return None, heuristic(board)
+
+        key = board << 2 | MAX_NODE
+        stored = self.lookup(key, depth, alpha, beta)
+        if stored is not None:
+            return stored
+        alphaOrig, betaOrig = alpha, beta
         maxChild = None
         maxUtility = float('-inf')
-        
-        possibleMoves = state.getAvailableMoves();
-        
-        for move, newState in possibleMoves:
-            # utility calculated by minimize(state with  move)
+
+        for move in (UP, DOWN, LEFT, RIGHT):
+            newBoard = move_board(board, move)
+            if newBoard == board:
+                continue
+            # utility calculated by minimize(board with move)
             # check if util is better than max util so far
-            _, utility = self.minimize(newState, alpha, beta, depth+1)
-            
-            if time.process_time() - self.startTime >= self.timeLimit:
-                break
-            
+            _, utility = self.minimize(newBoard, alpha, beta, depth+1)
+
             if utility > maxUtility:
                 maxUtility = utility
                 maxChild = move
-            
+
             if maxUtility >= beta:
                 break
-            
+
             if maxUtility > alpha:
                 alpha = maxUtility
-                
+
+        self.remember(key, depth, alphaOrig, betaOrig, maxChild, maxUtility)
         return maxChild, maxUtility
-    
-   
-    def terminal(self, state):
-        # exhausted time limit
-        # or have gone too far in the tree
-        if state.canMove() == False:
-            return True
-        return False
-    
-    def calculate_monotonicity(self, grid):
-        w4 = 8
-        w3 = 4
-        w2 = 2
-        w1 = 1
-        
-        weights = [[[w4, w3, w2, w1],
-                   [w3, -1, -1, -1],
-                   [w2, -1, -1, -1],
-                   [w1, -1, -1, -1]],
-                   
-                   [[w1, w2, w3, w4],
-                    [-1, -1, -1, w3],
-                    [-1, -1, -1, w2],
-                    [-1, -1, -1, w1]],
-                   
-                   [[w1, -1, -1, -1],
-                    [w2, -1, -1, -1],
-                    [w3, -1, -1, -1],
-                    [w4, w3, w2, w1]],
-                   
-                   [[-1, -1, -1, w1],
-                    [-1, -1, -1, w2],
-                    [-1, -1, -1, w3],
-                    [w1, w2, w3, w4]]]
-        
-        # We initialize the monotonicity score for all directions
-        monotonicity = [0, 0, 0, 0]
-    
-        # Now we iterate over all the directions
-        for d in range(4):
-            for x in range(4):
-                for y in range(4):
-                    if weights[d][x][y] != -1:  # We only consider the tiles that are not marked as -1
-                        value = math.log2(grid.map[x][y]) if grid.map[x][y] else 0
-                        monotonicity[d] += value * weights[d][x][y]
-    
-        total_monotonicity = max(monotonicity)
-        
-        return total_monotonicity
-        
-                   
-    
-    def calculate_empty_cells(self, grid):
-        return len(grid.getAvailableCells())
-    
-    def calculate_possible_merges(self, grid):
-        merge_count = 0
-        for x in range(4):
-            # Only go up to the second to last element for horizontal check
-            for y in range(3):  
-                if grid.map[x][y] == grid.map[x][y + 1] and grid.map[x][y] != 0:
-                    merge_count += 1
-        for y in range(4):
-            # Only go up to the second to last element for vertical check
-            for x in range(3):  
-                if grid.map[x][y] == grid.map[x + 1][y] and grid.map[x][y] != 0:
-                    merge_count += 1
-        return merge_count
-    
-
-    def h(self, grid):
-        empty_cells = self.calculate_empty_cells(grid)
-        monotonicity = self.calculate_monotonicity(grid)
-        merges = self.calculate_possible_merges(grid)
-        #smoothness = self.calculate_smoothness(grid)
-        # Weight factors
-        weight_empty = 0.6
-        weight_mono = 0.13
-        weight_merge = 0.27
-    
-        # Calculate heuristic by combining empty cells count and monotonicity
-        heuristic_value = weight_mono * monotonicity + weight_empty * empty_cells + weight_merge * merges
-        return heuristic_value
\ No newline at end of file
+
+    def expectimax(self, board, prob, depth=0):
+        """
+        max node of the expectimax search, prob is the chance of reaching it
+        :return (best move, utility, plies searched below this node)
+        """
+        self.tick()
+        remaining = self.depthLimit - depth
+        if self.terminal(board):
+            # nothing lies below a finished game, so it counts as searched in full
+            return None, heuristic(board), remaining
+        if remaining <= 0:
+            return None, heuristic(board), 0
+
+        key = board << 2 | EXPECT_MAX_NODE
+        entry = self.table.probe(key)
+        if entry is not None and entry[0] >= remaining:
+            self.table.cutoffs += 1
+            return entry[3], entry[2], entry[0]
+
+        maxChild = None
+        maxUtility = float('-inf')
+        searched = remaining
+        for move in (UP, DOWN, LEFT, RIGHT):
+            newBoard = move_board(board, move)
+            if newBoard == board:
+                continue
+            utility, childSearched = self.chance(newBoard, prob, depth + 1)
+            searched = min(searched, childSearched + 1)
+            if utility > maxUtility:
+                maxUtility = utility
+                maxChild = move
+
+        self.table.store(key, searched, EXACT, maxUtility, maxChild)
+        return maxChild, maxUtility, searched
+
+    def chance(self, board, prob, depth):
+        """
+        expected utility over the spawns: a 2 with probability 0.9 or a 4 with
+        0.1 in each empty cell, all cells equally likely
+        :return (utility, plies searched below this node), which is less than
+        the depth left when a spawn below probThreshold was cut short
+        """
+        self.tick()
+        remaining = self.depthLimit - depth
+        if remaining <= 0:
+            return heuristic(board), 0
+
+        key = board << 2 | CHANCE_NODE
+        entry = self.table.probe(key)
+        if entry is not None and entry[0] >= remaining:
+            self.table.cutoffs += 1
+            return entry[2], entry[0]
+
+        cells = empty_cells(board)
+        # the chance of a spawn landing in a given cell counts every empty cell,
+        # even when only a sample of them is searched and averaged
+        cellProb = prob / len(cells)
+        if len(cells) > self.chanceSamples:
+            cells = random.sample(cells, self.chanceSamples)
+        total = 0.0
+        searched = remaining
+        for cell in cells:
+            for tile, tileProb in SPAWNS:
+                spawned = board | tile << (4 * cell)
+                # a spawn too unlikely to matter is scored as it lands instead of searched
+                if tileProb * cellProb < self.probThreshold:
+                    total += tileProb * heuristic(spawned)
+                    searched = min(searched, 1)
+                else:
+                    _, utility, childSearched = self.expectimax(spawned, tileProb * cellProb, depth + 1)
+                    total += tileProb * utility
+                    searched = min(searched, childSearched + 1)
+
+        utility = total / len(cells)
+        # stored at the depth really searched, so a likelier path to this board searches it again
+        self.table.store(key, searched, EXACT, utility, None)
+        return utility, searched
+
+
+    def terminal(self, board):
+        # no move changes the board, which needs a full board first
+        if EMPTY[board & ROW_MASK] or EMPTY[(board >> 16) & ROW_MASK] or \
+                EMPTY[(board >> 32) & ROW_MASK] or EMPTY[board >> 48]:
+            return False
+        for move in (UP, DOWN, LEFT, RIGHT):
+            if move_board(board, move) != board:
+                return False
+        return True
+
+
+_WORKER = {}
+
+
+def _init_worker(mode, probThreshold, chanceSamples, checkStride):
+    agent = IntelligentAgent()
+    agent.mode, agent.probThreshold = mode, probThreshold
+    agent.chanceSamples, agent.checkStride = chanceSamples, checkStride
+    agent.clock = time.monotonic
+    _WORKER["agent"] = agent
+
+
+def _warm_up():
+    # long enough that the warm-up tasks spread over every worker
+    time.sleep(0.05)
+
+
+def search_root_moves(moves, maxDepth, deadline):
+    """
+    Search the boards after some root moves in a worker, all of them to
+    depth 1, then 3, ... up to maxDepth, stopping at the time.monotonic()
+    deadline.
+    :param moves : (move, board after it) pairs
+    :return ({move: the score of each depth finished, shallowest first},
+             how much each table counter grew during this search)
+    """
+    agent = _WORKER["agent"]
+    agent.deadline = deadline
+    agent.nodes = 0
+    agent.table.newMove()
+    before = agent.table.counters()
+    scores = {move: [] for move, _ in moves}
+    agent.depthLimit = 1
+    try:
+        while agent.depthLimit <= maxDepth:
+            # a move only gets a score for a depth once every move of the share has one
+            for move, score in agent.searchRoot(moves).items():
+                scores[move].append(score)
+            agent.depthLimit += 2
+    except SearchTimeout:
+        pass
+    after = agent.table.counters()
+    return scores, {name: after[name] - before[name] for name in TABLE_COUNTERS}
@@ -4,40 +4,199 @@ from __future__ import print_function
 import sys
 import math
 import time
+import os
+import json
+import mmap
+import signal
+import struct
+import sqlite3
+import argparse
 import resource
-import queue as Q
+import concurrent.futures
+import contextlib
+from collections import deque
 
 
 #### SKELETON CODE ####
+## Linear conflicts of one row or column, filled in on first use
+class LineConflicts(dict):
+    """
+        Maps the packed contents of one line of the board to the number of
+        tiles that must leave the line so the tiles whose goal lies in it
+        are in goal order. Twice that count is the linear-conflict term.
+    """
+    def __init__(self, tables, line, goalLine, goalAlong):
+        """
+        :param line->int : index of the row (or column)
+        :param goalLine->List : goal row (or column) of every tile
+        :param goalAlong->List : goal position of every tile along the line
+        """
+        super(LineConflicts, self).__init__()
+        self.tables    = tables
+        self.line      = line
+        self.goalLine  = goalLine
+        self.goalAlong = goalAlong
+
+    def __missing__(self, packed):
+        bits, mask = self.tables.bits, self.tables.mask
+        tiles = [(packed >> (bits * i)) & mask for i in range(self.tables.n)]
+        order = [self.goalAlong[tile] for tile in tiles if tile != 0 and self.goalLine[tile] == self.line]
+        # tiles outside the longest increasing run have to step out of the line
+        longest = [1] * len(order)
+        for i in range(len(order)):
+            for j in range(i):
+                if order[j] < order[i] and longest[j] + 1 > longest[i]:
+                    longest[i] = longest[j] + 1
+        conflicts = len(order) - max(longest, default=0)
+        self[packed] = conflicts
+        return conflicts
+
+
+## Precomputed bit layout shared by every board of the same size
+class BoardTables(object):
+    """
+        Packs an n*n board into a single integer, tile at index i stored in
+        bits [bits*i, bits*(i+1)), and precomputes the shift and move tables
+        so children can be generated with a few integer operations.
+        A transposed copy of the board keeps every column contiguous too.
+        The goal layout is precomputed into a packed board and a table of
+        goal positions, so the goal test is a single integer comparison.
+    """
+    def __init__(self, n, goal=None):
+        """
+        :param n->int : Size of the board
+        :param goal->List : goal layout, defaults to [0, 1, ..., n*n-1]
+        """
+        self.n     = n
+        self.size  = n * n
+        # 4 bits per tile covers the 8- and 15-puzzle, larger boards need more
+        self.bits  = max(4, (self.size - 1).bit_length())
+        self.mask  = (1 << self.bits) - 1
+        self.lineMask = (1 << (self.bits * n)) - 1
+        self.shifts = [self.bits * i for i in range(self.size)]
+        if goal is None:
+            goal = list(range(self.size))
+        if len(goal) != self.size or set(goal) != set(range(self.size)):
+            raise Exception("Goal contains invalid/duplicate entries : ", goal)
+        self.goalTiles = list(goal)
+        self.goal  = self.pack(self.goalTiles)
+        # goalPositions[tile] is the index the tile occupies in the goal layout
+        self.goalPositions = [0] * self.size
+        for i, tile in enumerate(self.goalTiles):
+            self.goalPositions[tile] = i
+        # index r*n+c of the board is stored at index c*n+r of the transposed board
+        self.transpose = [(i % n) * n + i // n for i in range(self.size)]
+
+        # manhattan[tile][position] is the distance of tile from its goal, 0 for the blank
+        self.goalRow = [position // n for position in self.goalPositions]
+        self.goalCol = [position % n for position in self.goalPositions]
+        self.manhattan = [[0 if tile == 0 else
+                           abs(self.goalRow[tile] - position // n) + abs(self.goalCol[tile] - position % n)
+                           for position in range(self.size)] for tile in range(self.size)]
+        self.rowConflicts = [LineConflicts(self, row, self.goalRow, self.goalCol) for row in range(n)]
+        self.colConflicts = [LineConflicts(self, col, self.goalCol, self.goalRow) for col in range(n)]
+
+        # moves[blank] holds (action, target, blank shift, target shift, transposed blank shift,
+        # transposed target shift, lines) in UDLR order, where lines describes the two rows
+        # (vertical moves) or columns (horizontal moves) whose linear conflicts change
+        self.moves = []
+        for blank in range(self.size):
+            row, col = divmod(blank, n)
+            targets = []
+            if row > 0:
+                targets.append(("Up", blank - n))
+            if row < n - 1:
+                targets.append(("Down", blank + n))
+            if col > 0:
+                targets.append(("Left", blank - 1))
+            if col < n - 1:
+                targets.append(("Right", blank + 1))
+            moves = []
+            for action, target in targets:
+                if action in ("Up", "Down"):
+                    lines = (False, self.rowConflicts[row], self.shifts[row * n],
+                             self.rowConflicts[target // n], self.shifts[(target // n) * n])
+                else:
+                    lines = (True, self.colConflicts[col], self.shifts[col * n],
+                             self.colConflicts[target % n], self.shifts[(target % n) * n])
+                moves.append((action, target, self.shifts[blank], self.shifts[target],
+                               self.shifts[self.transpose[blank]], self.shifts[self.transpose[target]], lines))
+            self.moves.append(tuple(moves))
+
+    def pack(self, config):
+        """ Pack a list of tiles into a single integer """
+        packed = 0
+        for i, tile in enumerate(config):
+            packed |= tile << self.shifts[i]
+        return packed
+
+    def unpack(self, packed):
+        """ Unpack an integer board back into a list of tiles """
+        mask = self.mask
+        return [(packed >> shift) & mask for shift in self.shifts]
+
+    def linear_conflicts(self, packed, transposed):
+        """ Count the linear conflicts of a whole board from scratch """
+        n, lineMask = self.n, self.lineMask
+        return (sum(self.rowConflicts[i][(packed >> self.shifts[i * n]) & lineMask] for i in range(n)) +
+                sum(self.colConflicts[i][(transposed >> self.shifts[i * n]) & lineMask] for i in range(n)))
+
+
+_TABLES = {}
+
+def get_tables(n, goal=None):
+    """ Return the (cached) BoardTables for an n*n board and goal layout """
+    key = (n, tuple(goal) if goal is not None else None)
+    tables = _TABLES.get(key)
+    if tables is None:
+        tables = _TABLES[key] = BoardTables(n, goal)
+    return tables
+
+
 ## The Class that Represents the Puzzle
 class PuzzleState(object):
     """
         The PuzzleState stores a board configuration and implements
         movement instructions to generate valid children.
     """
-    def __init__(self, config, n, parent=None, action="Initial", cost=0, depth=0, heuristic=0):
+    __slots__ = ("n", "tables", "config", "tconfig", "blank_index", "parent", "action", "cost", "depth",
+                 "heuristic", "md", "lc")
+
+    def __init__(self, config, n, parent=None, action="Initial", cost=0, depth=0, heuristic=0, goal=None):
         """
         :param config->List : Represents the n*n board, for e.g. [0,1,2,3,4,5,6,7,8] represents the goal state.
+                              A board already packed by BoardTables.pack is accepted as well.
         :param n->int : Size of the board
         :param parent->PuzzleState
         :param action->string
         :param cost->int
+        :param goal->List : goal layout, defaults to [0, 1, ..., n*n-1]
         """
-        if n*n != len(config) or n < 2:
+        if n < 2:
+            raise Exception("The length of config is not correct!")
+        tables = get_tables(n, goal)
+        if not isinstance(config, list):
+            config = tables.unpack(config)
+        if n*n != len(config):
             raise Exception("The length of config is not correct!")
         if set(config) != set(range(n*n)):
             raise Exception("Config contains invalid/duplicate entries : ", config)
 
-        self.n        = n
-        self.cost     = cost
-        self.parent   = parent
-        self.action   = action
-        self.config   = config
-        self.children = []
-        self.depth    = depth
+        # Validation only happens here, children are built by _child
+        self.n         = n
+        self.tables    = tables
+        self.config    = tables.pack(config)
+        self.blank_index = config.index(0)
+        self.parent    = parent
+        self.action    = action
+        self.cost      = cost
+        self.depth     = depth
+        self.heuristic = heuristic
 
-        # Get the index and (row, col) of empty block
-        self.blank_index = self.config.index(0)
+        # children update these incrementally instead of rescanning the board
+        self.tconfig   = tables.pack([config[i] for i in tables.transpose])
+        self.md        = calculate_total_cost(self)
+        self.lc        = tables.linear_conflicts(self.config, self.tconfig)
     
     def __lt__(self, other):
         cost = self.cost + self.heuristic
@@ -48,142 +207,272 @@ class PuzzleState(object):
             return actionDict[self.action] < actionDict[other.action]
         return cost < otherCost
 
+    def tiles(self):
+        """ Return the board as a list of tiles """
+        return self.tables.unpack(self.config)
+
     def display(self):
         """ Display this Puzzle state as a n*n board """
+        config = self.tiles()
         for i in range(self.n):
-            print(self.config[3*i : 3*(i+1)])
+            print(config[self.n*i : self.n*(i+1)])
+
+    def _child(self, move):
+        """
+        Slide the tile at the move's target into the blank.
+        :return a PuzzleState with the new configuration
+        """
+        action, target, blank_shift, target_shift, tblank_shift, ttarget_shift, lines = move
+        tables = self.tables
+        tile = (self.config >> target_shift) & tables.mask
+        config  = self.config - (tile << target_shift) + (tile << blank_shift)
+        tconfig = self.tconfig - (tile << ttarget_shift) + (tile << tblank_shift)
+
+        # only the two lines the tile leaves and enters change their conflicts
+        transposed, conflictsA, shiftA, conflictsB, shiftB = lines
+        before, after = (self.tconfig, tconfig) if transposed else (self.config, config)
+        lineMask = tables.lineMask
+        lc = (self.lc
+              + conflictsA[(after >> shiftA) & lineMask] + conflictsB[(after >> shiftB) & lineMask]
+              - conflictsA[(before >> shiftA) & lineMask] - conflictsB[(before >> shiftB) & lineMask])
+        distances = tables.manhattan[tile]
+
+        child = PuzzleState.__new__(PuzzleState)
+        child.n           = self.n
+        child.tables      = tables
+        child.config      = config
+        child.tconfig     = tconfig
+        child.blank_index = target
+        child.parent      = self
+        child.action      = action
+        child.cost        = self.cost + 1
+        child.depth       = self.depth + 1
+        child.heuristic   = 0
+        child.md          = self.md + distances[self.blank_index] - distances[target]
+        child.lc          = lc
+        return child
+
+    def _move(self, action):
+        for move in self.tables.moves[self.blank_index]:
+            if move[0] == action:
+                return self._child(move)
+        return None
 
     def move_up(self):
         """ 
         Moves the blank tile one row up.
         :return a PuzzleState with the new configuration
         """
-        if(self.blank_index - self.n >= 0):
-            updated_config = self.config[:]
-            temp = updated_config[self.blank_index]
-            updated_config[self.blank_index] = updated_config[self.blank_index - self.n]
-            updated_config[self.blank_index - self.n] = temp
-            return PuzzleState(updated_config, self.n, parent=self, action="Up", cost=self.cost+1, depth=self.depth+1, heuristic=0)
-        else: 
-            return None
+        return self._move("Up")
       
     def move_down(self):
         """
         Moves the blank tile one row down.
         :return a PuzzleState with the new configuration
         """
-        if(self.blank_index + self.n <= len(self.config) - 1):
-        
-            updated_config = self.config[:]
-            temp = updated_config[self.blank_index]
-            updated_config[self.blank_index] = updated_config[self.blank_index + self.n]
-            updated_config[self.blank_index + self.n] = temp
-            return PuzzleState(updated_config, self.n, parent=self, action="Down", cost=self.cost+1, depth=self.depth+1, heuristic=0)
-        
-        else:
-            return None
+        return self._move("Down")
       
     def move_left(self):
         """
         Moves the blank tile one column to the left.
         :return a PuzzleState with the new configuration
         """
-        if(self.blank_index % self.n != 0):
-            updated_config = self.config[:]
-            temp = updated_config[self.blank_index]
-            updated_config[self.blank_index] = updated_config[self.blank_index - 1]
-            updated_config[self.blank_index - 1] = temp
-            return PuzzleState(updated_config, self.n, parent=self, action="Left", cost=self.cost+1, depth=self.depth+1, heuristic=0)
-
-        else:
-            return None
+        return self._move("Left")
 
     def move_right(self):
         """
         Moves the blank tile one column to the right.
         :return a PuzzleState with the new configuration
         """
-        if((self.blank_index + 1) % self.n != 0):
-            updated_config = self.config[:]
-            temp = updated_config[self.blank_index]
-            updated_config[self.blank_index] = updated_config[self.blank_index + 1]
-            updated_config[self.blank_index + 1] = temp
-            return PuzzleState(updated_config, self.n, parent=self, action="Right", cost=self.cost+1, depth=self.depth+1, heuristic=0)
-        else:
-            return None
+        return self._move("Right")
       
     def expand(self):
-        """ Generate the child nodes of this node """
-        
-        # Node has already been expanded
-        if len(self.children) != 0:
-            return self.children
-        
-        # Add child nodes in order of UDLR
-        children = [
-            self.move_up(),
-            self.move_down(),
-            self.move_left(),
-            self.move_right()]
+        """ Generate the child nodes of this node in order of UDLR """
+        return [self._child(move) for move in self.tables.moves[self.blank_index]]
+
+## Open list used by A* search
+class BucketQueue(object):
+    """
+        Priority queue for small non-negative integer keys, such as the
+        f-values of unit-cost puzzles. Every key owns a bucket that is popped
+        LIFO, so among equal f-values the most recently pushed state wins.
+        No locking and no heap comparisons are involved.
+    """
+    __slots__ = ("buckets", "minKey", "size")
+
+    def __init__(self):
+        self.buckets = []
+        self.minKey  = 0
+        self.size    = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, key, item):
+        """ Add item with priority key """
+        buckets = self.buckets
+        while len(buckets) <= key:
+            buckets.append([])
+        buckets[key].append(item)
+        if key < self.minKey or self.size == 0:
+            self.minKey = key
+        self.size += 1
+
+    def min_key(self):
+        """ Smallest key currently in the queue """
+        buckets = self.buckets
+        key = self.minKey
+        while not buckets[key]:
+            key += 1
+        self.minKey = key
+        return key
+
+    def pop(self):
+        """ Remove and return (key, item) with the smallest key """
+        buckets = self.buckets
+        key = self.minKey
+        while not buckets[key]:
+            key += 1
+        self.minKey = key
+        self.size -= 1
+        return key, buckets[key].pop()
+
+## Instrumentation shared by all searches
+def current_ram():
+    """
+    Resident memory of this process now, in the units of ru_maxrss (KiB on
+    Linux). Falls back to the ru_maxrss high-water mark where /proc is missing.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pages * (resource.getpagesize() // 1024)
+
+class SearchStats(object):
+    """
+        Counters for one search run. Memory is sampled every sampleEvery
+        expansions instead of with a syscall per node, while the frontier
+        peak is updated exactly by the searches after every push. The
+        depth-first searches keep no frontier and report the longest path
+        they held instead. Phase timers are only kept when asked for.
+    """
+    def __init__(self, sampleEvery=1024, timers=False):
+        """
+        :param sampleEvery->int : expansions between memory samples
+        :param timers->bool : keep wall-clock totals for named phases
+        """
+        self.sampleEvery      = sampleEvery
+        self.nodesExpanded    = 0
+        self.nodesGenerated   = 0
+        self.duplicatesPruned = 0
+        self.stalePops        = 0
+        self.frontierPeak     = 0
+        self.pathPeak         = 0
+        self.maxDepth         = 0
+        self.maxRam           = 0
+        self.phases           = {} if timers else None
+        # current rather than peak memory, so a pool worker reports each instance's own growth
+        self.startRam         = current_ram()
 
-        # Compose self.children of all non-None children states
-        self.children = [state for state in children if state is not None]
-        return self.children
+    def sample(self, frontierSize=0):
+        """ Record the peak memory growth and frontier size seen so far """
+        ram = (current_ram() - self.startRam)/(2**20)
+        self.maxRam = max(ram, self.maxRam)
+        self.frontierPeak = max(frontierSize, self.frontierPeak)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ Add the time spent inside the with block to the named phase """
+        if self.phases is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def result(self, goal_state, frontierSize=0):
+        """ Take a last sample and build the tuple every search returns """
+        self.sample(frontierSize)
+        return goal_state, self.nodesExpanded, self.maxDepth, self.maxRam
+
+    def as_dict(self):
+        """ Structured copy of the counters for reports """
+        stats = {
+            "nodes_expanded":    self.nodesExpanded,
+            "nodes_generated":   self.nodesGenerated,
+            "duplicates_pruned": self.duplicatesPruned,
+            "stale_pops":        self.stalePops,
+            "frontier_peak":     self.frontierPeak,
+            "path_peak":         self.pathPeak,
+            "max_search_depth":  self.maxDepth,
+            "max_ram_usage":     self.maxRam,
+        }
+        if self.phases is not None:
+            stats["phases"] = dict(self.phases)
+        return stats
 
 # Function that Writes to output.txt
 
 ### Students need to change the method to have the corresponding parameters
 def writeOutput(goal_state, nodesExpanded, maxDepth, maxRam, totalTime):
     ### Student Code Goes here
-    path = get_path(goal_state)
+    # goal_state is None when the board cannot reach the goal
+    path = get_path(goal_state) if goal_state is not None else None
     pathString = str(path)
+    cost = goal_state.cost if goal_state is not None else None
+    depth = goal_state.depth if goal_state is not None else None
     # always 8 decimal places
     maxRam = format(maxRam, '.8f')
     totalTime = format(totalTime, '.8f')
     with open("output.txt", "w") as file:
         file.write("path_to_goal: " + pathString + "\n")
-        file.write("cost_of_path: " + str(goal_state.cost) + "\n")
+        file.write("cost_of_path: " + str(cost) + "\n")
         file.write("nodes_expanded: " + str(nodesExpanded) + "\n")
-        file.write("search_depth: " + str(goal_state.depth) + "\n")
+        file.write("search_depth: " + str(depth) + "\n")
         file.write("max_search_depth: " + str(maxDepth) + "\n")
         file.write("running_time: " + totalTime + "\n")
         file.write("max_ram_usage: " + maxRam + "\n") # check if this is correct or not
         
 
-def bfs_search(initial_state):
+def bfs_search(initial_state, stats=None):
     """BFS search"""
     ### STUDENT CODE GOES HERE ###
-    frontier = Q.Queue()
-    frontier.put(initial_state)
+    if stats is None:
+        stats = SearchStats()
+    frontier = deque([initial_state])
     explored = set()
     frontierSet = set()
-    frontierSet.add(tuple(initial_state.config))
-    nodesExpanded = 0
-    maxDepth = 0
-    startRam =  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-    maxRam = 0
+    frontierSet.add(initial_state.config)
     
-    while not frontier.empty():
-        state = frontier.get()
-        explored.add(tuple(state.config))
+    while frontier:
+        state = frontier.popleft()
+        explored.add(state.config)
         
-        if(state.depth > maxDepth):
-            maxDepth = state.depth
-            
-        ram = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startRam)/(2**20)
-        maxRam = max(ram, maxRam)
+        if(state.depth > stats.maxDepth):
+            stats.maxDepth = state.depth
         
         if(test_goal(state)):
-            return state, nodesExpanded, maxDepth, maxRam
+            return stats.result(state, len(frontier))
         
-        nodesExpanded += 1
+        stats.nodesExpanded += 1
+        if stats.nodesExpanded % stats.sampleEvery == 0:
+            stats.sample()
         for child in state.expand():
-            if tuple(child.config) not in explored and tuple(child.config) not in frontierSet:
-                frontier.put(child)
-                frontierSet.add(tuple(child.config))
-                if(child.depth > maxDepth):
-                    maxDepth = child.depth
-    return None, nodesExpanded, maxDepth, maxRam
+            stats.nodesGenerated += 1
+            if child.config not in explored and child.config not in frontierSet:
+                frontier.append(child)
+                frontierSet.add(child.config)
+                if(child.depth > stats.maxDepth):
+                    stats.maxDepth = child.depth
+            else:
+                stats.duplicatesPruned += 1
+        if len(frontier) > stats.frontierPeak:
+            stats.frontierPeak = len(frontier)
+    return stats.result(None)
 
 def get_path(goal_state):
     path = []
@@ -195,139 +484,810 @@ def get_path(goal_state):
     return path[::-1]
         
     
-def dfs_search(initial_state):
+def dfs_search(initial_state, stats=None):
     """DFS search"""
     ### STUDENT CODE GOES HERE ###
-    frontier = Q.LifoQueue()
-    frontier.put(initial_state)
+    if stats is None:
+        stats = SearchStats()
+    frontier = [initial_state]
     explored = set()
     frontierSet = set()
-    frontierSet.add(tuple(initial_state.config))
-    nodesExpanded = 0
-    maxDepth = 0
-    startRam =  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-    maxRam = 0
+    frontierSet.add(initial_state.config)
     
     while frontier:
-        state = frontier.get()
-        explored.add(tuple(state.config))
+        state = frontier.pop()
+        explored.add(state.config)
         
-        if(state.depth > maxDepth):
-            maxDepth = state.depth
-            
-        ram = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startRam)/(2**20)
-        maxRam = max(ram, maxRam)
+        if(state.depth > stats.maxDepth):
+            stats.maxDepth = state.depth
         
         if(test_goal(state)):
-            return state, nodesExpanded, maxDepth, maxRam
+            return stats.result(state, len(frontier))
         
-        nodesExpanded += 1
+        stats.nodesExpanded += 1
+        if stats.nodesExpanded % stats.sampleEvery == 0:
+            stats.sample()
         #reverse to make sure UDLR order when popped out of the stack
         for child in reversed(state.expand()):
-            if tuple(child.config) not in explored and tuple(child.config) not in frontierSet:
-                frontier.put(child)
-                frontierSet.add(tuple(child.config))
-                if(child.depth > maxDepth):
-                    maxDepth = child.depth
-    return None, nodesExpanded, maxDepth, maxRam
-
-def A_star_search(initial_state):
+            stats.nodesGenerated += 1
+            if child.config not in explored and child.config not in frontierSet:
+                frontier.append(child)
+                frontierSet.add(child.config)
+                if(child.depth > stats.maxDepth):
+                    stats.maxDepth = child.depth
+            else:
+                stats.duplicatesPruned += 1
+        if len(frontier) > stats.frontierPeak:
+            stats.frontierPeak = len(frontier)
+    return stats.result(None)
+
+def A_star_search(initial_state, heuristic=None, stats=None):
     """A * search"""
+    if heuristic is None:
+        heuristic = manhattan_heuristic
+    if stats is None:
+        stats = SearchStats()
     ### STUDENT CODE GOES HERE ###
-    frontier = Q.PriorityQueue()
-    initial_state.heuristic = calculate_total_cost(initial_state)
-    frontier.put((initial_state.cost + initial_state.heuristic, initial_state))
+    frontier = BucketQueue()
+    initial_state.heuristic = heuristic(initial_state)
+    frontier.push(initial_state.cost + initial_state.heuristic, initial_state)
     explored = set()
+    # best known path cost of every config generated so far
     frontierDict = {}
-    frontierDict[tuple(initial_state.config)] = initial_state.cost + initial_state.heuristic
-    nodesExpanded = 0
-    maxDepth = 0
-    startRam =  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-    maxRam = 0
+    frontierDict[initial_state.config] = initial_state.cost
     
-    while not frontier.empty():
-        priority, state = frontier.get()
-        explored.add(tuple(state.config))
+    while frontier:
+        priority, state = frontier.pop()
+        # lazy deletion: skip entries superseded by a cheaper path
+        if state.config in explored or state.cost > frontierDict[state.config]:
+            stats.stalePops += 1
+            continue
+        explored.add(state.config)
         
-        if(state.depth > maxDepth):
-            maxDepth = state.depth
-            
-        ram = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startRam)/(2**20)
-        maxRam = max(ram, maxRam)
+        if(state.depth > stats.maxDepth):
+            stats.maxDepth = state.depth
         
         if(test_goal(state)):
-            return state, nodesExpanded, maxDepth, maxRam
+            return stats.result(state, len(frontier))
         
-        nodesExpanded += 1
+        stats.nodesExpanded += 1
+        if stats.nodesExpanded % stats.sampleEvery == 0:
+            stats.sample()
+        #reverse so that equal f-values still pop in UDLR order
+        for child in reversed(state.expand()):
+            stats.nodesGenerated += 1
+            if child.config in explored:
+                stats.duplicatesPruned += 1
+                continue
+            bestCost = frontierDict.get(child.config)
+            if bestCost is None or child.cost < bestCost:
+                child.heuristic = heuristic(child)
+                frontier.push(child.cost + child.heuristic, child)
+                frontierDict[child.config] = child.cost
+                if child.depth > stats.maxDepth:
+                    stats.maxDepth = child.depth
+            else:
+                stats.duplicatesPruned += 1
+        if len(frontier) > stats.frontierPeak:
+            stats.frontierPeak = len(frontier)
+    return stats.result(None)
+
+def ida_search(initial_state, heuristic=None, stats=None):
+    """IDA * search, memory grows only with the depth of the current path"""
+    if heuristic is None:
+        heuristic = manhattan_heuristic
+    if stats is None:
+        stats = SearchStats()
+    initial_state.heuristic = heuristic(initial_state)
+    bound = initial_state.cost + initial_state.heuristic
+
+    def probe(state, bound):
+        """depth-first search below bound, returns (goal, smallest f above bound)"""
+        f = state.cost + state.heuristic
+        if f > bound:
+            return None, f
+        if state.depth > stats.maxDepth:
+            stats.maxDepth = state.depth
+        if test_goal(state):
+            return state, f
+
+        stats.nodesExpanded += 1
+        if stats.nodesExpanded % stats.sampleEvery == 0:
+            stats.sample()
+        # the recursion holds the states from the root down to this one
+        if state.depth + 1 > stats.pathPeak:
+            stats.pathPeak = state.depth + 1
+        nextBound = float('inf')
+        grandparent = state.parent.config if state.parent else None
         for child in state.expand():
-            child.heuristic = calculate_total_cost(child)
-            if tuple(child.config) not in explored and (tuple(child.config) not in frontierDict):
-                frontier.put((child.cost + child.heuristic, child))
-                frontierDict[tuple(child.config)] = child.cost + child.heuristic
-                if child.depth > maxDepth:
-                    maxDepth = child.depth
-            elif (tuple(child.config) in frontierDict) and child.cost + child.heuristic < frontierDict[tuple(child.config)]:
-                frontier.put((child.cost + child.heuristic, child))
-                frontierDict[tuple(child.config)] = child.cost + child.heuristic
-    return None, nodesExpanded, maxDepth, maxRam
+            stats.nodesGenerated += 1
+            # never undo the move that led here
+            if child.config == grandparent:
+                stats.duplicatesPruned += 1
+                continue
+            child.heuristic = heuristic(child)
+            goal, childBound = probe(child, bound)
+            if goal is not None:
+                return goal, childBound
+            nextBound = min(nextBound, childBound)
+        return None, nextBound
+
+    while bound < float('inf'):
+        goal, bound = probe(initial_state, bound)
+        if goal is not None:
+            return stats.result(goal)
+    return stats.result(None)
+
+def rbfs_search(initial_state, heuristic=None, stats=None):
+    """Recursive best-first search, keeps only the current path and its siblings"""
+    if heuristic is None:
+        heuristic = manhattan_heuristic
+    if stats is None:
+        stats = SearchStats()
+    initial_state.heuristic = heuristic(initial_state)
+
+    def rbfs(state, stateF, bound):
+        """returns (goal, backed-up f-value of state)"""
+        if state.depth > stats.maxDepth:
+            stats.maxDepth = state.depth
+        if test_goal(state):
+            return state, stateF
+
+        stats.nodesExpanded += 1
+        if stats.nodesExpanded % stats.sampleEvery == 0:
+            stats.sample()
+        # the recursion holds the states from the root down to this one
+        if state.depth + 1 > stats.pathPeak:
+            stats.pathPeak = state.depth + 1
+        grandparent = state.parent.config if state.parent else None
+        children = []
+        for order, child in enumerate(state.expand()):
+            stats.nodesGenerated += 1
+            if child.config == grandparent:
+                stats.duplicatesPruned += 1
+                continue
+            child.heuristic = heuristic(child)
+            childF = child.cost + child.heuristic
+            # a child inherits the backed-up value of a previously explored parent
+            if state.cost + state.heuristic < stateF:
+                childF = max(childF, stateF)
+            # order breaks f-value ties in UDLR order
+            children.append([childF, order, child])
+        if not children:
+            return None, float('inf')
+
+        while True:
+            children.sort(key=lambda entry: (entry[0], entry[1]))
+            best = children[0]
+            if best[0] > bound:
+                return None, best[0]
+            alternative = children[1][0] if len(children) > 1 else float('inf')
+            goal, best[0] = rbfs(best[2], best[0], min(bound, alternative))
+            if goal is not None:
+                return goal, best[0]
+
+    goal, _ = rbfs(initial_state, initial_state.cost + initial_state.heuristic, float('inf'))
+    return stats.result(goal)
+
+# the blank move that undoes each action
+INVERSE_ACTION = {"Up": "Down", "Down": "Up", "Left": "Right", "Right": "Left"}
+
+def goal_state_for(initial_state):
+    """the goal PuzzleState for boards of the same size as initial_state"""
+    return PuzzleState(initial_state.tables.goalTiles, initial_state.n, goal=initial_state.tables.goalTiles)
+
+def join_paths(forward_state, backward_state):
+    """
+    Extend the forward chain ending in forward_state along the backward
+    chain that leads from backward_state (same config) to the goal.
+    :return the goal PuzzleState whose parent chain is the whole path
+    """
+    state = forward_state
+    curr = backward_state
+    while curr.parent:
+        state = state._move(INVERSE_ACTION[curr.action])
+        curr = curr.parent
+    return state
+
+def bidirectional_bfs_search(initial_state, stats=None):
+    """Bidirectional BFS, grows the smaller of the two frontiers one layer at a time"""
+    if stats is None:
+        stats = SearchStats()
+    goal = goal_state_for(initial_state)
+    if test_goal(initial_state):
+        return stats.result(initial_state)
+
+    forward, backward = {initial_state.config: initial_state}, {goal.config: goal}
+    forwardLayer, backwardLayer = [initial_state], [goal]
+    while forwardLayer and backwardLayer:
+        if len(forwardLayer) <= len(backwardLayer):
+            layer, seen, other = forwardLayer, forward, backward
+        else:
+            layer, seen, other = backwardLayer, backward, forward
+
+        nextLayer = []
+        best = None
+        for state in layer:
+            stats.nodesExpanded += 1
+            for child in state.expand():
+                stats.nodesGenerated += 1
+                if child.config in seen:
+                    stats.duplicatesPruned += 1
+                    continue
+                seen[child.config] = child
+                nextLayer.append(child)
+                # finish the layer so the shortest of all meetings is kept
+                match = other.get(child.config)
+                if match is not None and (best is None or child.depth + match.depth < best[0]):
+                    best = (child.depth + match.depth, child, match)
+
+        if nextLayer and nextLayer[0].depth > stats.maxDepth:
+            stats.maxDepth = nextLayer[0].depth
+        stats.sample()
+        # the layer being expanded is held until its children are all generated
+        frontierSize = len(layer) + len(nextLayer) + len(backwardLayer if seen is forward else forwardLayer)
+        if frontierSize > stats.frontierPeak:
+            stats.frontierPeak = frontierSize
+        if best is not None:
+            _, child, match = best
+            if seen is forward:
+                return stats.result(join_paths(child, match))
+            return stats.result(join_paths(match, child))
+
+        if seen is forward:
+            forwardLayer = nextLayer
+        else:
+            backwardLayer = nextLayer
+    return stats.result(None)
+
+def manhattan_to(state, positions):
+    """manhattan distance between state and the board whose tile positions are given"""
+    n = state.n
+    total = 0
+    for i, tile in enumerate(state.tiles()):
+        if tile != 0:
+            total += abs(i // n - positions[tile] // n) + abs(i % n - positions[tile] % n)
+    return total
+
+def mm_search(initial_state, stats=None):
+    """
+    Bidirectional heuristic search that meets in the middle (MM). Each side
+    expands by priority max(f, 2g), so neither search passes the midpoint
+    of an optimal path, and it stops once no open node can beat the best
+    meeting found so far.
+    """
+    if stats is None:
+        stats = SearchStats()
+    goal = goal_state_for(initial_state)
+    if test_goal(initial_state):
+        return stats.result(initial_state)
+
+    # the backward search estimates the distance back to the start board
+    startPositions = [0] * (initial_state.n * initial_state.n)
+    for i, tile in enumerate(initial_state.tiles()):
+        startPositions[tile] = i
+    sides = []
+    for root, heuristic in ((initial_state, manhattan_heuristic),
+                            (goal, lambda state: manhattan_to(state, startPositions))):
+        root.heuristic = heuristic(root)
+        frontier = BucketQueue()
+        frontier.push(max(root.heuristic, 0), root)
+        sides.append({"frontier": frontier, "heuristic": heuristic, "best": {root.config: root},
+                      "closed": set()})
+    forward, backward = sides
+
+    bestCost, meeting = float('inf'), None
+    while forward["frontier"] and backward["frontier"]:
+        forwardKey, backwardKey = forward["frontier"].min_key(), backward["frontier"].min_key()
+        if bestCost <= min(forwardKey, backwardKey):
+            break
+        side, other = (forward, backward) if forwardKey <= backwardKey else (backward, forward)
+
+        _, state = side["frontier"].pop()
+        # lazy deletion: skip entries superseded by a cheaper path
+        if state.config in side["closed"] or side["best"][state.config] is not state:
+            stats.stalePops += 1
+            continue
+        side["closed"].add(state.config)
+        stats.nodesExpanded += 1
+        if state.depth > stats.maxDepth:
+            stats.maxDepth = state.depth
+        if stats.nodesExpanded % stats.sampleEvery == 0:
+            stats.sample()
+
+        for child in state.expand():
+            stats.nodesGenerated += 1
+            known = side["best"].get(child.config)
+            if known is not None and known.cost <= child.cost:
+                stats.duplicatesPruned += 1
+                continue
+            side["closed"].discard(child.config)
+            side["best"][child.config] = child
+            child.heuristic = side["heuristic"](child)
+            side["frontier"].push(max(child.cost + child.heuristic, 2 * child.cost), child)
+            match = other["best"].get(child.config)
+            if match is not None and child.cost + match.cost < bestCost:
+                bestCost = child.cost + match.cost
+                meeting = (child, match) if side is forward else (match, child)
+        frontierSize = len(forward["frontier"]) + len(backward["frontier"])
+        if frontierSize > stats.frontierPeak:
+            stats.frontierPeak = frontierSize
+
+    frontierSize = len(forward["frontier"]) + len(backward["frontier"])
+    if meeting is None:
+        return stats.result(None, frontierSize)
+    return stats.result(join_paths(*meeting), frontierSize)
 
 def calculate_total_cost(state):
     """calculate the total estimated cost of a state"""
     ### STUDENT CODE GOES HERE ###
     sum = 0
-    for i in range(len(state.config)):
-        if state.config[i] != 0:
-            sum += calculate_manhattan_dist(i, state.config[i], state.n)
+    config = state.tiles()
+    goalPositions = state.tables.goalPositions
+    for i in range(len(config)):
+        if config[i] != 0:
+            sum += calculate_manhattan_dist(i, config[i], state.n, goalPositions[config[i]])
     return sum
 
-def calculate_manhattan_dist(idx, value, n):
-    """calculate the manhattan distance of a tile"""
+def manhattan_heuristic(state):
+    """manhattan distance carried incrementally by the state"""
+    return state.md
+
+def linear_conflict_heuristic(state):
+    """manhattan distance plus two moves for every tile that has to leave its row or column"""
+    return state.md + 2 * state.lc
+
+def calculate_manhattan_dist(idx, value, n, goalIdx=None):
+    """calculate the manhattan distance of a tile, goalIdx defaults to the blank-first goal"""
     ### STUDENT CODE GOES HERE ###
-    goalRow = value // n
-    goalCol = value % n
+    if goalIdx is None:
+        goalIdx = value
+    goalRow = goalIdx // n
+    goalCol = goalIdx % n
     
     currRow = idx // n
     currCol = idx % n
     return abs(goalRow - currRow) + abs(goalCol - currCol)
 
+def rank_pattern(positions, size):
+    """rank the positions of k distinct tiles on a board of size cells into [0, size!/(size-k)!)"""
+    rank = 0
+    for i, position in enumerate(positions):
+        digit = position
+        for earlier in positions[:i]:
+            if earlier < position:
+                digit -= 1
+        rank = rank * (size - i) + digit
+    return rank
+
+def unrank_pattern(rank, k, size):
+    """inverse of rank_pattern"""
+    digits = []
+    for i in range(k - 1, -1, -1):
+        rank, digit = divmod(rank, size - i)
+        digits.append(digit)
+    digits.reverse()
+    free = list(range(size))
+    return [free.pop(digit) for digit in digits]
+
+class PatternDatabase(object):
+    """
+        One additive pattern database: the number of moves of the pattern
+        tiles needed to bring them home, for every placement of those tiles.
+        Stored as a small header (magic, n, pattern size, pattern tiles, goal
+        layout) followed by one byte per ranked placement, and memory-mapped
+        read-only so solver processes share the page cache.
+    """
+    MAGIC  = b"PDB2"
+    HEADER = "<4sBB"
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n, k = struct.unpack_from(self.HEADER, self.table, 0)
+        if magic != self.MAGIC:
+            raise Exception("Not a pattern database file : ", path)
+        start = struct.calcsize(self.HEADER)
+        self.size    = self.n * self.n
+        self.pattern = list(self.table[start : start + k])
+        self.goal    = list(self.table[start + k : start + k + self.size])
+        self.offset  = start + k + self.size
+
+    def lookup(self, positions):
+        """:param positions->List : position of every tile, indexed by tile"""
+        return self.table[self.offset + rank_pattern([positions[tile] for tile in self.pattern], self.size)]
+
+    @classmethod
+    def build(cls, n, pattern, path, goal=None):
+        """
+        Retrograde breadth-first search from the goal over placements of the
+        pattern tiles plus the blank. Only moves of pattern tiles are counted,
+        so databases over disjoint patterns can be added together.
+        """
+        size  = n * n
+        k     = len(pattern)
+        tables = get_tables(n, goal)
+        moves = tables.moves
+        entries = 1
+        for i in range(k):
+            entries *= size - i
+        unseen = 255
+        table = bytearray([unseen]) * entries
+        # cost of every (placement rank, blank position) pair reached so far
+        dist  = bytearray([unseen]) * (entries * size)
+
+        start = rank_pattern([tables.goalPositions[tile] for tile in pattern], size) * size + tables.goalPositions[0]
+        dist[start] = 0
+        layer, cost = [start], 0
+        while layer:
+            nextLayer = []
+            # moves of the blank into free cells are free and stay in this layer
+            layer = deque(layer)
+            while layer:
+                key = layer.popleft()
+                if dist[key] != cost:
+                    continue
+                rank, blank = divmod(key, size)
+                if table[rank] == unseen:
+                    table[rank] = cost
+                positions = unrank_pattern(rank, k, size)
+                for move in moves[blank]:
+                    target = move[1]
+                    if target in positions:
+                        moved = positions[:]
+                        moved[positions.index(target)] = blank
+                        child = rank_pattern(moved, size) * size + target
+                        if dist[child] > cost + 1:
+                            dist[child] = cost + 1
+                            nextLayer.append(child)
+                    else:
+                        child = rank * size + target
+                        if dist[child] > cost:
+                            dist[child] = cost
+                            layer.append(child)
+            layer, cost = nextLayer, cost + 1
+
+        with open(path, "wb") as file:
+            file.write(struct.pack(cls.HEADER, cls.MAGIC, n, k))
+            file.write(bytes(pattern))
+            file.write(bytes(tables.goalTiles))
+            file.write(table)
+
+class PatternDatabaseHeuristic(object):
+    """sum of disjoint pattern databases, used in place of calculate_total_cost"""
+    def __init__(self, paths):
+        if not paths:
+            raise Exception("The pdb heuristic needs at least one pattern database")
+        self.databases = [PatternDatabase(path) for path in paths]
+        seen = set()
+        for database in self.databases:
+            if seen & set(database.pattern):
+                raise Exception("Pattern databases must cover disjoint tiles")
+            seen |= set(database.pattern)
+        # the board tables the databases were last checked against
+        self.tables = None
+
+    def check(self, tables):
+        for database in self.databases:
+            if database.n != tables.n or database.goal != tables.goalTiles:
+                raise Exception("Pattern database is for a different board size or goal")
+        self.tables = tables
+
+    def __call__(self, state):
+        # every state of a search shares the root's cached tables, so this checks once per search
+        if state.tables is not self.tables:
+            self.check(state.tables)
+        positions = [0] * state.tables.size
+        for i, tile in enumerate(state.tiles()):
+            positions[tile] = i
+        total = 0
+        for database in self.databases:
+            total += database.lookup(positions)
+        return total
+
 def test_goal(puzzle_state):
     """test the state is the goal state or not"""
     ### STUDENT CODE GOES HERE ###
-    goal = list(range(0, puzzle_state.n*puzzle_state.n))
-    if(puzzle_state.config == goal):
-        return True
+    return puzzle_state.config == puzzle_state.tables.goal
+
+# Search functions selectable from the command line
+SEARCH_MODES = {
+    "bfs":  bfs_search,
+    "dfs":  dfs_search,
+    "ast":  A_star_search,
+    "ida":  ida_search,
+    "rbfs": rbfs_search,
+    "bibfs": bidirectional_bfs_search,
+    "mm":   mm_search,
+}
+
+# Searches that take a heuristic
+HEURISTIC_MODES = {"ast", "ida", "rbfs"}
+
+def search_options(search_mode, heuristic="manhattan", pdb=()):
+    """keyword arguments selecting the heuristic for a search mode"""
+    options = {}
+    if search_mode in HEURISTIC_MODES and heuristic == "linear":
+        options["heuristic"] = linear_conflict_heuristic
+    elif search_mode in HEURISTIC_MODES and heuristic == "pdb":
+        options["heuristic"] = PatternDatabaseHeuristic(pdb)
+    return options
+
+# Searches guaranteed to return a shortest path, whose results may be cached
+OPTIMAL_MODES = {"bfs", "ast", "ida", "rbfs", "bibfs", "mm"}
+
+def is_solvable(state):
+    """
+    Every move swaps the blank with a neighbour, flipping both the parity of
+    the permutation from the goal and the parity of the blank's distance
+    from its goal cell, so a board is solvable exactly when the two agree.
+    """
+    tables = state.tables
+    goalPositions = [0] * tables.size
+    for i, tile in enumerate(tables.unpack(tables.goal)):
+        goalPositions[tile] = i
+    order = [goalPositions[tile] for tile in state.tiles()]
+    inversions = 0
+    for i in range(len(order)):
+        for j in range(i + 1, len(order)):
+            if order[i] > order[j]:
+                inversions += 1
+    blank = goalPositions[0]
+    distance = abs(state.blank_index // state.n - blank // state.n) + abs(state.blank_index % state.n - blank % state.n)
+    return inversions % 2 == distance % 2
+
+class SolutionCache(object):
+    """
+        Persistent store of optimal solutions in an SQLite file, keyed by the
+        board size, goal and packed config. Paths are kept as UDLR letters.
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (board TEXT PRIMARY KEY, path TEXT NOT NULL)")
+        self.connection.commit()
+
+    def _key(self, state):
+        return "%d:%x:%x" % (state.n, state.tables.goal, state.config)
+
+    def get(self, initial_state):
+        """:return the cached goal PuzzleState reached from initial_state, or None"""
+        row = self.connection.execute("SELECT path FROM solutions WHERE board = ?",
+                                      (self._key(initial_state),)).fetchone()
+        if row is None:
+            return None
+        letters = {action[0]: action for action in INVERSE_ACTION}
+        state = initial_state
+        for letter in row[0]:
+            state = state._move(letters[letter])
+        return state
+
+    def put(self, initial_state, goal_state):
+        path = "".join(action[0] for action in get_path(goal_state))
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO solutions (board, path) VALUES (?, ?)",
+                                    (self._key(initial_state), path))
+
+def solve(search_mode, initial_state, options=None, cache=None, stats=None):
+    """
+    Run a search mode behind the solvability check and the optional
+    solution cache. Unsolvable boards return a None goal immediately.
+    :param stats->SearchStats : collects the counters, a default one is used if omitted
+    :return the same (goal_state, nodesExpanded, maxDepth, maxRam) tuple as the searches
+    """
+    if stats is None:
+        stats = SearchStats()
+    with stats.phase("solvability"):
+        solvable = is_solvable(initial_state)
+    if not solvable:
+        return stats.result(None)
+    useCache = cache is not None and search_mode in OPTIMAL_MODES
+    if useCache:
+        with stats.phase("cache"):
+            goal_state = cache.get(initial_state)
+        if goal_state is not None:
+            stats.maxDepth = goal_state.depth
+            return stats.result(goal_state)
+    with stats.phase("search"):
+        result = SEARCH_MODES[search_mode](initial_state, stats=stats, **(options or {}))
+    if useCache and result[0] is not None:
+        with stats.phase("cache"):
+            cache.put(initial_state, result[0])
+    return result
+
+def parse_board(text):
+    """parse comma separated tiles into (tiles, n), rejecting boards that are not square"""
+    tiles = list(map(int, text.split(",")))
+    n = int(math.sqrt(len(tiles)))
+    if n * n != len(tiles):
+        raise Exception("The length of config is not correct!")
+    return tiles, n
+
+#### BATCH SOLVING ####
+class SearchTimeout(Exception):
+    """raised inside a batch worker when an instance runs out of time"""
+
+def _raise_timeout(signum, frame):
+    raise SearchTimeout()
+
+# per-process search settings, filled in by _init_worker
+_WORKER = {}
+
+def _init_worker(search_mode, heuristic, pdb, timeout, cache, sampleEvery, timers, goal):
+    _WORKER["mode"]    = search_mode
+    _WORKER["goal"]    = goal
+    _WORKER["sampleEvery"] = sampleEvery
+    _WORKER["timers"]  = timers
+    _WORKER["options"] = search_options(search_mode, heuristic, pdb)
+    _WORKER["cache"]   = SolutionCache(cache) if cache else None
+    _WORKER["timeout"] = timeout
+    signal.signal(signal.SIGALRM, _raise_timeout)
+
+def solve_instance(index, line):
+    """solve one comma separated board inside a worker and describe the result as a dict"""
+    result = {"index": index, "config": line}
+    start_time = time.time()
+    stats = SearchStats(_WORKER["sampleEvery"], _WORKER["timers"])
+    try:
+        begin_state, board_size = parse_board(line)
+        hard_state  = PuzzleState(begin_state, board_size, goal=_WORKER["goal"])
+        if _WORKER["timeout"]:
+            signal.setitimer(signal.ITIMER_REAL, _WORKER["timeout"])
+        try:
+            goal_state, nodesExpanded, maxDepth, maxRam = solve(_WORKER["mode"], hard_state, _WORKER["options"],
+                                                                _WORKER["cache"], stats)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except SearchTimeout:
+        result["status"] = "timeout"
+    except Exception as error:
+        result["status"] = "error"
+        result["error"]  = str(error)
     else:
-        return False
+        result["status"] = "solved" if goal_state is not None else "unsolvable"
+        if goal_state is not None:
+            result["path_to_goal"] = get_path(goal_state)
+            result["cost_of_path"] = goal_state.cost
+            result["search_depth"] = goal_state.depth
+        result["nodes_expanded"]   = nodesExpanded
+        result["max_search_depth"] = maxDepth
+        result["max_ram_usage"]    = maxRam
+        result["stats"]            = stats.as_dict()
+    result["running_time"] = time.time() - start_time
+    return result
+
+def run_batch(source, output, search_mode, heuristic="manhattan", pdb=(), workers=None, timeout=None,
+              cache=None, sampleEvery=1024, timers=False, goal=None):
+    """
+    Stream boards, one per line, from source across a process pool and write
+    every result to output as a JSON line as soon as it completes.
+    :return summary dict with counts and instances/sec
+    """
+    workers = workers or os.cpu_count() or 1
+    # keep a bounded number of instances in flight so huge inputs are never read up front
+    window  = workers * 4
+    counts  = {"instances": 0, "solved": 0, "unsolvable": 0, "timeout": 0, "error": 0}
+    start_time = time.time()
+
+    def new_pool():
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                      initargs=(search_mode, heuristic, list(pdb), timeout, cache,
+                                                                sampleEvery, timers, goal))
+
+    def drain(pending, returnWhen):
+        """:param pending->dict : future -> (index, line) of the instances in flight"""
+        done, _ = concurrent.futures.wait(pending, return_when=returnWhen)
+        for future in done:
+            index, line = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as error:
+                # a worker killed mid-instance (e.g. by the OOM killer) breaks the whole pool
+                result = {"index": index, "config": line, "status": "error",
+                          "error": "%s: %s" % (type(error).__name__, error)}
+            counts[result["status"]] += 1
+            output.write(json.dumps(result) + "\n")
+        output.flush()
+        return pending
+
+    pool = new_pool()
+    try:
+        pending = {}
+        for line in source:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                future = pool.submit(solve_instance, counts["instances"], line)
+            except concurrent.futures.BrokenExecutor:
+                # the instances still in flight are reported as errors, the rest go to a fresh pool
+                drain(pending, concurrent.futures.ALL_COMPLETED)
+                pool.shutdown()
+                pool = new_pool()
+                future = pool.submit(solve_instance, counts["instances"], line)
+            pending[future] = (counts["instances"], line)
+            counts["instances"] += 1
+            if len(pending) >= window:
+                pending = drain(pending, concurrent.futures.FIRST_COMPLETED)
+        if pending:
+            drain(pending, concurrent.futures.ALL_COMPLETED)
+    finally:
+        pool.shutdown()
+
+    counts["running_time"] = time.time() - start_time
+    counts["instances_per_sec"] = counts["instances"] / counts["running_time"] if counts["running_time"] > 0 else 0.0
+    return counts
 
 # Main Function that reads in Input and Runs corresponding Algorithm
 def main():
-    search_mode = sys.argv[1].lower()
-    begin_state = sys.argv[2].split(",")
-    begin_state = list(map(int, begin_state))
-    board_size  = int(math.sqrt(len(begin_state)))
-    hard_state  = PuzzleState(begin_state, board_size)
-    start_time  = time.time()
-    
-    if   search_mode == "bfs": 
-        goal_state, nodesExpanded, maxDepth, maxRam = bfs_search(hard_state)
-        end_time = time.time()
-        totalTime = end_time - start_time
-        writeOutput(goal_state, nodesExpanded, maxDepth, maxRam, totalTime)
-    elif search_mode == "dfs": 
-        goal_state, nodesExpanded, maxDepth, maxRam = dfs_search(hard_state)
-        end_time = time.time()
-        totalTime = end_time - start_time
-        writeOutput(goal_state, nodesExpanded, maxDepth, maxRam, totalTime)
-    elif search_mode == "ast": 
-        goal_state, nodesExpanded, maxDepth, maxRam = A_star_search(hard_state)
-        end_time = time.time()
-        totalTime = end_time - start_time
-        writeOutput(goal_state, nodesExpanded, maxDepth, maxRam, totalTime)
-    else: 
+    parser = argparse.ArgumentParser(description="Solve an n-puzzle board.")
+    parser.add_argument("search_mode", help="one of %s, or pdbgen to build a pattern database"
+                        % ", ".join(sorted(SEARCH_MODES)))
+    parser.add_argument("board", nargs="?", help="comma separated tiles, 0 is the blank")
+    parser.add_argument("--heuristic", choices=["manhattan", "linear", "pdb"], default="manhattan")
+    parser.add_argument("--pdb", action="append", default=[],
+                        help="pattern database file, repeat for each disjoint pattern")
+    parser.add_argument("--goal", help="comma separated goal layout, defaults to 0,1,...,n*n-1")
+    parser.add_argument("--size", type=int, help="board size n for pdbgen")
+    parser.add_argument("--pattern", help="comma separated tiles of the pattern for pdbgen")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="solve every board in FILE (- for stdin) and print JSON lines instead")
+    parser.add_argument("--workers", type=int, help="worker processes for --batch, defaults to the cpu count")
+    parser.add_argument("--timeout", type=float, help="seconds allowed per instance in --batch")
+    parser.add_argument("--cache", metavar="FILE", help="SQLite file of known optimal solutions to reuse and extend")
+    parser.add_argument("--stats", action="store_true", help="print the search counters as JSON")
+    parser.add_argument("--timers", action="store_true", help="time the solvability, cache and search phases")
+    parser.add_argument("--sample-every", type=int, default=1024,
+                        help="expansions between memory and frontier samples")
+    args = parser.parse_args()
+    search_mode = args.search_mode.lower()
+    goal = parse_board(args.goal)[0] if args.goal else None
+
+    if search_mode == "pdbgen":
+        if args.size is None or args.pattern is None or len(args.pdb) != 1:
+            print("pdbgen needs --size, --pattern and one --pdb output file")
+            return
+        pattern = list(map(int, args.pattern.split(",")))
+        start_time = time.time()
+        PatternDatabase.build(args.size, pattern, args.pdb[0], goal)
+        print("Built %s in %.3f second(s)"%(args.pdb[0], time.time()-start_time))
+        return
+
+    if args.heuristic == "pdb" and not args.pdb:
+        print("--heuristic pdb needs one --pdb file for each disjoint pattern")
+        return
+
+    if search_mode in SEARCH_MODES and args.batch:
+        source = sys.stdin if args.batch == "-" else open(args.batch)
+        with source:
+            summary = run_batch(source, sys.stdout, search_mode, args.heuristic, args.pdb,
+                                args.workers, args.timeout, args.cache, args.sample_every, args.timers, goal)
+        sys.stderr.write(json.dumps(summary) + "\n")
+        return
+
+    if search_mode not in SEARCH_MODES or args.board is None:
         print("Enter valid command arguments !")
+        return
+
+    begin_state, board_size = parse_board(args.board)
+    hard_state  = PuzzleState(begin_state, board_size, goal=goal)
+    options = search_options(search_mode, args.heuristic, args.pdb)
+    cache = SolutionCache(args.cache) if args.cache else None
+    stats = SearchStats(args.sample_every, args.timers)
+    start_time  = time.time()
+
+    goal_state, nodesExpanded, maxDepth, maxRam = solve(search_mode, hard_state, options, cache, stats)
+    end_time = time.time()
+    totalTime = end_time - start_time
+    writeOutput(goal_state, nodesExpanded, maxDepth, maxRam, totalTime)
     
-    
+    if goal_state is None:
+        print("The board cannot reach the goal state")
     print("Program completed in %.3f second(s)"%(end_time-start_time))
+    if totalTime > 0:
+        print("Expanded %d nodes (%.0f nodes/sec)"%(nodesExpanded, nodesExpanded/totalTime))
+    if args.stats:
+        print(json.dumps(stats.as_dict()))
 
 if __name__ == '__main__':
     main()
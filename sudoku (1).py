@@ -13,13 +13,95 @@ Created on Sun Oct 15 22:52:17 2023
 Each sudoku board is represented as a dictionary with string keys and
 int values.
 e.g. my_board['A1'] = 8
+
+Internally the solver works on cells indexed 0..80 (row-major) with the
+candidates of every cell kept as a 9-bit mask, bit v-1 set when v is
+still possible. Boards of any N^2 x N^2 size work the same way, with
+N^4 cells and an N^2-bit mask per cell.
 """
+import os
 import sys
+import json
 import time
+import random
+import argparse
+from itertools import combinations, islice
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor, FIRST_COMPLETED, wait
+
+try:
+    import numpy as np
+except ImportError:  # only needed for --vectorize
+    np = None
 
 ROW = "ABCDEFGHI"
 COL = "123456789"
 
+class MaskTable(object):
+    """table[mask] computed on demand, for sizes where a list of 2**size entries would not fit"""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __getitem__(self, mask):
+        return self.fn(mask)
+
+
+class Geometry(object):
+    """
+    Precomputed index tables for a board of box x box boxes, size = box**2
+    values and size**2 cells, indexed row-major.
+    """
+
+    def __init__(self, box):
+        self.box = box
+        self.size = size = box * box
+        self.cells = cells = size * size
+        self.allValues = (1 << size) - 1
+        # units holds the size rows, then the size columns, then the size boxes
+        self.units = ([[size * r + c for c in range(size)] for r in range(size)] +
+                      [[size * r + c for r in range(size)] for c in range(size)] +
+                      [[size * (box * (b // box) + r) + box * (b % box) + c for r in range(box) for c in range(box)]
+                       for b in range(size)])
+        self.rowOf = [i // size for i in range(cells)]
+        self.colOf = [i % size for i in range(cells)]
+        self.boxOf = [box * (i // (size * box)) + (i % size) // box for i in range(cells)]
+        self.peers = [tuple(sorted(set(self.units[self.rowOf[i]] + self.units[size + self.colOf[i]] +
+                                       self.units[2 * size + self.boxOf[i]]) - {i}))
+                      for i in range(cells)]
+        # values[mask] lists the values whose bits are set in mask, smallest first
+        if size <= 16:
+            self.popcount = [bin(mask).count("1") for mask in range(self.allValues + 1)]
+            self.values = [[v + 1 for v in range(size) if mask >> v & 1] for mask in range(self.allValues + 1)]
+        else:
+            self.popcount = MaskTable(int.bit_count)
+            self.values = MaskTable(lambda mask: [v + 1 for v in range(size) if mask >> v & 1])
+        # bits used for the cell index in an undo trail entry
+        self.cellBits = cells.bit_length()
+        self.cellMask = (1 << self.cellBits) - 1
+
+
+_GEOMETRIES = {}
+
+
+def get_geometry(box):
+    """Geometry tables are built once per box size and shared."""
+    if box not in _GEOMETRIES:
+        _GEOMETRIES[box] = Geometry(box)
+    return _GEOMETRIES[box]
+
+
+def geometry_for(cells):
+    """The geometry of a board with the given number of cells."""
+    box = round(cells ** 0.25)
+    if box < 2 or box ** 4 != cells:
+        raise ValueError("A board needs box**4 cells (81, 256, 625, ...), got %d" % cells)
+    return get_geometry(box)
+
+
+# cell keys of the 9x9 board dictionaries
+KEYS = [r + c for r in ROW for c in COL]
+
 
 def print_board(board):
     """Helper function to print board in a square."""
@@ -40,162 +122,643 @@ def board_to_string(board):
     return ''.join(ordered_vals)
 
 
-# initially set the domains of the unassigned values in the board
-# greatly reduces runtime if we do an initial prune rather than just have
-# starting domains of 1-9
-def initial_domain_pruning(board):
-    domains = {key: {1,2,3,4,5,6,7,8,9} for key in board if board[key] == 0}
+class SearchLimit(Exception):
+    """raised by BitboardSudoku.search when it runs out of nodes"""
 
-    for key in board:
-        if board[key] != 0:
-            num = board[key]
-            
-            row, col = key[0], key[1]
 
-            # prune for row
-            for r in ROW:
-                if r + col in domains and num in domains[r + col]:
-                    domains[r + col].remove(num)
+class BitboardSudoku(object):
+    """
+    Sudoku search over the cells of any Geometry, 0..80 for 9x9. Domains
+    are size-bit masks and the row, column and box occupancy masks make
+    the validity of a value an O(1) test instead of a scan over 3 * size
+    cells.
 
-            # prune for column
-            for c in COL:
-                if row + c in domains and num in domains[row + c]:
-                    domains[row + c].remove(num)
+    Every change made during search is recorded on a single undo trail as
+    one int: old domain << cellBits | cell for a domain change, or
+    -1 - cell for an assignment. Backtracking rewinds the trail to a
+    checkpoint, so search allocates no per-node snapshots.
 
-            # prune for 3x3 box
-            boxRowStart, boxColStart = 3 * (ROW.index(row) // 3), 3 * (COL.index(col) // 3)
-            for r in range(3):
-                for c in range(3):
-                    boxKey = ROW[boxRowStart + r] + COL[boxColStart + c]
-                    if boxKey in domains and num in domains[boxKey]:
-                        domains[boxKey].remove(num)
+    Unless variables are picked by a full scan, buckets[k] is a bitmask of
+    the empty cells with k candidates left. It is kept up to date wherever
+    a domain or assignment changes, so MRV is the lowest set bit of the
+    first non-empty bucket.
+    """
 
-    return domains
+    def __init__(self, cells, strategies=(), geometry=None, varOrder="mrv", valueOrder="natural", recheck=True):
+        """
+        :param cells: row-major list of ints, 0 for an empty cell
+        :param strategies: names from STRATEGIES run to fixpoint after every assignment
+        :param geometry: board tables, found from len(cells) when omitted
+        :param varOrder: one of VAR_ORDERS
+        :param valueOrder: one of VALUE_ORDERS
+        :param recheck: test every value against the occupancy masks before assigning it,
+            which forward checking already guarantees
+        """
+        self.geo = geo = geometry or geometry_for(len(cells))
+        self.rowOf, self.colOf, self.boxOf = geo.rowOf, geo.colOf, geo.boxOf
+        self.cells = list(cells)
+        self.rowUsed = [0] * geo.size
+        self.colUsed = [0] * geo.size
+        self.boxUsed = [0] * geo.size
+        self.consistent = True
+        for i, num in enumerate(self.cells):
+            if num:
+                bit = 1 << (num - 1)
+                if not self.isValid(i, bit):
+                    self.consistent = False
+                self.place(i, bit)
+        # initial domain pruning: everything its row, column and box do not use yet
+        self.domains = [0 if num else geo.allValues & ~self.used(i) for i, num in enumerate(self.cells)]
+        self.unassigned = self.cells.count(0)
+        self.trail = []
+        if 0 in [self.domains[i] for i in range(geo.cells) if not self.cells[i]]:
+            self.consistent = False
+        self.strategies = [(name, STRATEGIES[name]) for name in strategies]
+        # per-strategy calls, trail entries added and seconds spent
+        self.strategyStats = {name: {"calls": 0, "changes": 0, "time": 0.0} for name in strategies}
+        # search nodes expanded and assignments undone, search raises SearchLimit once nodes reaches nodeLimit
+        self.nodes = 0
+        self.backtracks = 0
+        self.nodeLimit = None
+        if varOrder not in VAR_ORDERS or valueOrder not in VALUE_ORDERS:
+            raise ValueError("Unknown ordering %s / %s" % (varOrder, valueOrder))
+        self.varOrder, self.valueOrder, self.recheck = varOrder, valueOrder, recheck
+        self.buckets = None
+        if varOrder != "scan":
+            self.buckets = [0] * (geo.size + 1)
+            for i, num in enumerate(self.cells):
+                if not num:
+                    self.buckets[geo.popcount[self.domains[i]]] |= 1 << i
 
-def backtracking(board):
-    """Takes a board and returns solved board."""
-    # TODO: implement this
-    domains = initial_domain_pruning(board)      
-    solved_board = backtrack(board, domains)
-    return solved_board
-
-def backtrack(assignment, domains):
-    if(isComplete(assignment)):
-        return assignment
-    
-    var = select_unassigned_var(assignment, domains)
-    
-    for num in domains[var]:
-        if isValid(assignment, num, var):
-            assignment[var] = num
-            changes,originalDomain = forwardCheck(var, assignment, domains, num)
-            if not emptyDomains(domains): 
-                result = backtrack(assignment, domains)
-                
-                if result is not None:
-                    return result
-            
-            assignment[var] = 0
-            revertChange(changes, domains)
-            domains[var] = originalDomain
-            
-    return None
-
-def emptyDomains(domains):
-    for key in domains:
-        if len(domains[key]) == 0:
-            return True
-    return False
+    def used(self, i):
+        return self.rowUsed[self.rowOf[i]] | self.colUsed[self.colOf[i]] | self.boxUsed[self.boxOf[i]]
 
+    def isValid(self, i, bit):
+        return not self.used(i) & bit
 
-def revertChange(changes, domains):
-    for key in changes:
-        domains[key] |= changes[key] #set union to revert changes to domain
-        
-def forwardCheck(var, board, domains, num):
-    row = var[0]
-    col = var[1]
-    changes = dict()
-    originalDomain = domains[var].copy()
-    
-    #changing the domains in the other unassigned spots in the board, forawrd check
-    
-    # in the same row
-    for c in COL:
-        key = row + c
-        if board[key] == 0:
-            if num in domains[key]:
-                if key not in changes:
-                    changes[key] = set()
-                changes[key].add(num)
-                domains[key].discard(num)
-    
-    # in the same column
-    for r in ROW:
-         key = r + col
-         if board[key] == 0:
-             if num in domains[key]:
-                 if key not in changes:
-                     changes[key] = set()
-                 changes[key].add(num)
-                 domains[key].discard(num)
-    
-    # in the same box
-    boxRow = 3 * (ROW.index(row) // 3)
-    boxCol = 3 * (COL.index(col) // 3)
-    for r in range(3):
-        for c in range(3):
-            key = ROW[boxRow + r] + COL[boxCol + c]
-            if board[key] == 0:
-                if key not in changes:
-                    changes[key] = set()
-                changes[key].add(num)
-                domains[key].discard(num)
-    # returning the changes made so they can be reverted later
-    return changes, originalDomain
-    
-
-# uses minimum remaining value heuristic
-def select_unassigned_var(board, domains):
-    minimumVal = sys.maxsize
-    minimumKey = ""
-    for key in board:
-        if board[key] == 0:
-            if(len(domains[key]) < minimumVal):
-                minimumVal = len(domains[key])
-                minimumKey = key
-    return minimumKey
-
-def isValid(board, num, key):
-    row = key[0]
-    col = key[1]
-    
-    for r in ROW:
-        if board[r + col] == num:
-            return False
-    
-    for c in COL:
-        if board[row + c] == num:
-            return False
-    
-    boxRow = 3 * (ROW.index(row) // 3)
-    boxCol = 3 * (COL.index(col) // 3)
-    
-    for r in range(3):
-        for c in range(3):
-            if board[ROW[boxRow + r] + COL[boxCol + c]] == num:
+    def place(self, i, bit):
+        self.rowUsed[self.rowOf[i]] |= bit
+        self.colUsed[self.colOf[i]] |= bit
+        self.boxUsed[self.boxOf[i]] |= bit
+
+    def unplace(self, i, bit):
+        self.rowUsed[self.rowOf[i]] &= ~bit
+        self.colUsed[self.colOf[i]] &= ~bit
+        self.boxUsed[self.boxOf[i]] &= ~bit
+
+    def undo(self, mark):
+        """rewind the trail to a checkpoint taken with len(self.trail)"""
+        trail = self.trail
+        domains, buckets = self.domains, self.buckets
+        cellBits, cellMask, popcount = self.geo.cellBits, self.geo.cellMask, self.geo.popcount
+        while len(trail) > mark:
+            entry = trail.pop()
+            if entry >= 0:
+                i, old = entry & cellMask, entry >> cellBits
+                if buckets is not None:
+                    buckets[popcount[domains[i]]] ^= 1 << i
+                    buckets[popcount[old]] |= 1 << i
+                domains[i] = old
+            else:
+                i = -1 - entry
+                self.unplace(i, 1 << (self.cells[i] - 1))
+                self.cells[i] = 0
+                self.unassigned += 1
+                if buckets is not None:
+                    buckets[popcount[domains[i]]] |= 1 << i
+
+    def assign(self, i, num):
+        """
+        fill cell i with num and forward check its empty peers
+        :return False if a peer domain was wiped out
+        """
+        bit = 1 << (num - 1)
+        trail, cells, domains, buckets = self.trail, self.cells, self.domains, self.buckets
+        cellBits, popcount = self.geo.cellBits, self.geo.popcount
+        trail.append(-1 - i)
+        cells[i] = num
+        self.place(i, bit)
+        self.unassigned -= 1
+        if buckets is not None:
+            buckets[popcount[domains[i]]] ^= 1 << i
+        for peer in self.geo.peers[i]:
+            if cells[peer] == 0:
+                old = domains[peer]
+                if old & bit:
+                    # wipeout is detected here rather than by rescanning every domain
+                    if old == bit:
+                        return False
+                    trail.append(old << cellBits | peer)
+                    domains[peer] = old ^ bit
+                    if buckets is not None:
+                        count = popcount[old]
+                        buckets[count] ^= 1 << peer
+                        buckets[count - 1] |= 1 << peer
+        return True
+
+    def eliminate(self, i, mask):
+        """
+        remove the values in mask from the domain of empty cell i
+        :return False if the domain was wiped out
+        """
+        old = self.domains[i]
+        if old & mask:
+            if not old & ~mask:
                 return False
-    
-    return True
+            self.trail.append(old << self.geo.cellBits | i)
+            self.domains[i] = old & ~mask
+            if self.buckets is not None:
+                popcount = self.geo.popcount
+                self.buckets[popcount[old]] ^= 1 << i
+                self.buckets[popcount[old & ~mask]] |= 1 << i
+        return True
+
+    # -- propagation strategies, each returns False on a contradiction --
+
+    def nakedSingles(self):
+        """assign every empty cell that has a single candidate left"""
+        cells, domains = self.cells, self.domains
+        popcount = self.geo.popcount
+        for i in range(self.geo.cells):
+            if cells[i] == 0 and popcount[domains[i]] == 1:
+                if not self.assign(i, domains[i].bit_length()):
+                    return False
+        return True
+
+    def hiddenSingles(self):
+        """assign a value that fits in only one cell of a unit"""
+        cells, domains = self.cells, self.domains
+        allValues = self.geo.allValues
+        for unit in self.geo.units:
+            once = twice = placed = 0
+            for i in unit:
+                if cells[i]:
+                    placed |= 1 << (cells[i] - 1)
+                else:
+                    twice |= once & domains[i]
+                    once |= domains[i]
+            if once | placed != allValues:
+                return False
+            hidden = once & ~twice & ~placed
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for i in unit:
+                    if cells[i] == 0 and domains[i] & bit:
+                        if not self.assign(i, bit.bit_length()):
+                            return False
+                        break
+        return True
+
+    def nakedSubsets(self, k):
+        """k cells of a unit sharing k candidates remove them from the rest of the unit"""
+        cells, domains = self.cells, self.domains
+        popcount = self.geo.popcount
+        for unit in self.geo.units:
+            empty = [i for i in unit if cells[i] == 0 and popcount[domains[i]] <= k]
+            if len(empty) < k:
+                continue
+            for group in combinations(empty, k):
+                union = 0
+                for i in group:
+                    union |= domains[i]
+                if popcount[union] < k:
+                    return False
+                if popcount[union] == k:
+                    for i in unit:
+                        if cells[i] == 0 and i not in group and not self.eliminate(i, union):
+                            return False
+        return True
+
+    def hiddenSubsets(self, k):
+        """k values confined to the same k cells of a unit clear the other candidates of those cells"""
+        cells, domains = self.cells, self.domains
+        geo = self.geo
+        popcount, valuesOf = geo.popcount, geo.values
+        for unit in geo.units:
+            # where[v] is the mask of unit positions that still allow value v + 1
+            where = [0] * geo.size
+            for pos, i in enumerate(unit):
+                if cells[i] == 0:
+                    for num in valuesOf[domains[i]]:
+                        where[num - 1] |= 1 << pos
+            values = [v for v in range(geo.size) if 2 <= popcount[where[v]] <= k]
+            for group in combinations(values, k):
+                positions = keep = 0
+                for v in group:
+                    positions |= where[v]
+                    keep |= 1 << v
+                if popcount[positions] == k:
+                    for pos in valuesOf[positions]:
+                        if not self.eliminate(unit[pos - 1], geo.allValues & ~keep):
+                            return False
+        return True
+
+    def pointing(self):
+        """a value confined to one row or column of a box leaves the rest of that line"""
+        cells, domains = self.cells, self.domains
+        geo = self.geo
+        size, units, popcount, valuesOf = geo.size, geo.units, geo.popcount, geo.values
+        for b in range(size):
+            # rows[v] / cols[v] are the lines of the box where value v + 1 can still go
+            rows = [0] * size
+            cols = [0] * size
+            for i in units[2 * size + b]:
+                if cells[i] == 0:
+                    row, col = 1 << geo.rowOf[i], 1 << geo.colOf[i]
+                    for num in valuesOf[domains[i]]:
+                        rows[num - 1] |= row
+                        cols[num - 1] |= col
+            for v in range(size):
+                bit = 1 << v
+                for lines, offset in ((rows[v], 0), (cols[v], size)):
+                    if popcount[lines] == 1:
+                        for i in units[offset + lines.bit_length() - 1]:
+                            if cells[i] == 0 and domains[i] & bit and geo.boxOf[i] != b and not self.eliminate(i, bit):
+                                return False
+        return True
+
+    def boxLine(self):
+        """a value confined to one box within a row or column leaves the rest of that box"""
+        cells, domains = self.cells, self.domains
+        geo = self.geo
+        size, units, popcount, valuesOf = geo.size, geo.units, geo.popcount, geo.values
+        for u in range(2 * size):
+            lineOf = geo.rowOf if u < size else geo.colOf
+            # boxes[v] are the boxes of the line where value v + 1 can still go
+            boxes = [0] * size
+            for i in units[u]:
+                if cells[i] == 0:
+                    box = 1 << geo.boxOf[i]
+                    for num in valuesOf[domains[i]]:
+                        boxes[num - 1] |= box
+            for v in range(size):
+                bit = 1 << v
+                if popcount[boxes[v]] == 1:
+                    for i in units[2 * size + boxes[v].bit_length() - 1]:
+                        if cells[i] == 0 and domains[i] & bit and lineOf[i] != u % size and not self.eliminate(i, bit):
+                            return False
+        return True
+
+    def ac3(self):
+        """
+        arc consistency over the all-different constraints. For a binary
+        not-equal arc only a singleton domain can remove a value, so the
+        queue holds the cells whose domain has shrunk to one value.
+        """
+        cells, domains = self.cells, self.domains
+        popcount, peers = self.geo.popcount, self.geo.peers
+        queue = [i for i in range(self.geo.cells) if cells[i] == 0 and popcount[domains[i]] == 1]
+        while queue:
+            x = queue.pop()
+            d = domains[x]
+            for y in peers[x]:
+                if cells[y] == 0 and domains[y] & d:
+                    if not self.eliminate(y, d):
+                        return False
+                    if popcount[domains[y]] == 1:
+                        queue.append(y)
+        return True
+
+    def propagate(self):
+        """run the selected strategies until none of them changes anything"""
+        if not self.strategies:
+            return True
+        while True:
+            mark = len(self.trail)
+            for name, strategy in self.strategies:
+                stats = self.strategyStats[name]
+                before = len(self.trail)
+                start = time.perf_counter()
+                ok = strategy(self)
+                stats["time"] += time.perf_counter() - start
+                stats["calls"] += 1
+                stats["changes"] += len(self.trail) - before
+                if not ok:
+                    return False
+            if len(self.trail) == mark:
+                return True
+
+    def selectUnassigned(self):
+        """minimum remaining values, first cell wins ties unless they go to the highest degree"""
+        if self.buckets is None:
+            best, bestCount = -1, self.geo.size + 1
+            cells, domains = self.cells, self.domains
+            popcount = self.geo.popcount
+            for i in range(self.geo.cells):
+                if cells[i] == 0 and popcount[domains[i]] < bestCount:
+                    best, bestCount = i, popcount[domains[i]]
+            return best
+        for candidates in self.buckets:
+            if candidates:
+                if self.varOrder == "mrv_degree" and candidates & (candidates - 1):
+                    return self.mostConstraining(candidates)
+                return (candidates & -candidates).bit_length() - 1
+        return -1
+
+    def mostConstraining(self, candidates):
+        """degree heuristic: the cell of the bitmask with the most empty peers"""
+        cells, peers = self.cells, self.geo.peers
+        best, bestDegree = -1, -1
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            i = low.bit_length() - 1
+            degree = 0
+            for peer in peers[i]:
+                if cells[peer] == 0:
+                    degree += 1
+            if degree > bestDegree:
+                best, bestDegree = i, degree
+        return best
+
+    def orderValues(self, var):
+        """ascending values, or least constraining first: the value left in the fewest empty peer domains"""
+        values = self.geo.values[self.domains[var]]
+        if self.valueOrder == "natural" or len(values) < 2:
+            return values
+        cells, domains = self.cells, self.domains
+        peerDomains = [domains[peer] for peer in self.geo.peers[var] if cells[peer] == 0]
+        return sorted(values, key=lambda num: sum(d >> (num - 1) & 1 for d in peerDomains))
+
+    def search(self):
+        """:return True once every cell is filled"""
+        if self.unassigned == 0:
+            return True
+        self.nodes += 1
+        if self.nodes == self.nodeLimit:
+            raise SearchLimit()
+        var = self.selectUnassigned()
+        recheck = self.recheck
+        for num in self.orderValues(var):
+            if recheck and not self.isValid(var, 1 << (num - 1)):
+                continue
+            mark = len(self.trail)
+            if self.assign(var, num) and self.propagate() and self.search():
+                return True
+            self.undo(mark)
+            self.backtracks += 1
+        return False
+
+    def solve(self):
+        """:return the solved list of cells, or None"""
+        if not self.consistent or not self.propagate() or not self.search():
+            return None
+        return self.cells
+
+
+# Variable orderings: full MRV scan, MRV from the count buckets, and buckets with a degree tie-break
+VAR_ORDERS = ("scan", "mrv", "mrv_degree")
+VALUE_ORDERS = ("natural", "lcv")
+
+# Propagation strategies selectable by name, in their suggested order
+STRATEGIES = {
+    "naked_singles":  BitboardSudoku.nakedSingles,
+    "hidden_singles": BitboardSudoku.hiddenSingles,
+    "naked_pairs":    lambda solver: solver.nakedSubsets(2),
+    "hidden_pairs":   lambda solver: solver.hiddenSubsets(2),
+    "pointing":       BitboardSudoku.pointing,
+    "box_line":       BitboardSudoku.boxLine,
+    "naked_triples":  lambda solver: solver.nakedSubsets(3),
+    "hidden_triples": lambda solver: solver.hiddenSubsets(3),
+    "ac3":            BitboardSudoku.ac3,
+}
+
+
+class DancingLinks(object):
+    """
+    Sudoku as an exact cover problem solved with Knuth's Algorithm X on
+    dancing links, kept in flat arrays rather than node objects. The
+    4 * cells columns (0..323 for 9x9, shifted by one in the arrays where 0
+    is the root) are the cell, row-value, column-value and box-value
+    constraints. Every candidate (cell, value)
+    is a matrix row covering four of them. A DancingLinks object is used
+    for one search only.
+    """
+
+    def __init__(self, cells, geometry=None):
+        """:param cells: row-major list of ints, 0 for an empty cell"""
+        self.geo = geo = geometry or geometry_for(len(cells))
+        n, size = geo.cells, geo.size
+        columns = 4 * n
+        self.L = [i - 1 for i in range(columns + 1)]
+        self.R = [i + 1 for i in range(columns + 1)]
+        self.L[0], self.R[columns] = columns, 0
+        self.U = list(range(columns + 1))
+        self.D = list(range(columns + 1))
+        self.C = list(range(columns + 1))
+        self.S = [0] * (columns + 1)
+        # candidate (cell, value) encoded as cell * size + value - 1 for every node
+        self.candidate = [-1] * (columns + 1)
+        self.solution = []
+        self.solutions = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.first = None
+
+        givenRows = []
+        for i in range(n):
+            for num in ([cells[i]] if cells[i] else range(1, size + 1)):
+                v = num - 1
+                first = self.addRow(i * size + v, (1 + i, 1 + n + size * geo.rowOf[i] + v,
+                                                   1 + 2 * n + size * geo.colOf[i] + v,
+                                                   1 + 3 * n + size * geo.boxOf[i] + v))
+                if cells[i]:
+                    givenRows.append(first)
+
+        # the givens are selected up front, two clashing givens leave nothing to solve
+        self.consistent = True
+        for row in givenRows:
+            if not self.select(row):
+                self.consistent = False
+                break
+
+    def addRow(self, candidate, columns):
+        first = len(self.C)
+        for k, c in enumerate(columns):
+            node = first + k
+            self.L.append(first + (k - 1) % 4)
+            self.R.append(first + (k + 1) % 4)
+            self.U.append(self.U[c])
+            self.D.append(c)
+            self.D[self.U[c]] = node
+            self.U[c] = node
+            self.C.append(c)
+            self.candidate.append(candidate)
+            self.S[c] += 1
+        return first
 
-    
+    def cover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        L[R[c]], R[L[c]] = L[c], R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]], D[U[j]] = U[j], D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
 
-def isComplete(board):
-    # if there are no 0's left on the board it is complete, no values left to assign
-    for key in board:
-        if(board[key] == 0):
+    def uncover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = R[L[c]] = c
+
+    def select(self, row):
+        """cover every column of a given's row, False if one was already covered"""
+        j = row
+        while True:
+            c = self.C[j]
+            if self.R[self.L[c]] != c:
+                return False
+            self.cover(c)
+            j = self.R[j]
+            if j == row:
+                return True
+
+    def search(self, limit):
+        """:return True once limit solutions have been found"""
+        R, D, S = self.R, self.D, self.S
+        if R[0] == 0:
+            self.solutions += 1
+            if self.first is None:
+                self.first = list(self.solution)
+            return self.solutions >= limit
+        self.nodes += 1
+        # pick the column with the fewest remaining rows
+        best, c = R[0], R[R[0]]
+        while c != 0:
+            if S[c] < S[best]:
+                best = c
+            c = R[c]
+        if S[best] == 0:
             return False
-    return True
+        self.cover(best)
+        r = D[best]
+        while r != best:
+            self.solution.append(self.candidate[r])
+            j = R[r]
+            while j != r:
+                self.cover(self.C[j])
+                j = R[j]
+            if self.search(limit):
+                return True
+            j = self.L[r]
+            while j != r:
+                self.uncover(self.C[j])
+                j = self.L[j]
+            self.solution.pop()
+            self.backtracks += 1
+            r = D[r]
+        self.uncover(best)
+        return False
+
+    def run(self, limit):
+        if self.consistent:
+            self.search(limit)
+        return self.solutions
+
+    def solve(self, cells):
+        """:return the solved list of cells, or None"""
+        if not self.run(1):
+            return None
+        size = self.geo.size
+        solved = list(cells)
+        for candidate in self.first:
+            solved[candidate // size] = candidate % size + 1
+        return solved
+
+
+def count_solutions(cells, limit=2):
+    """Count the solutions of a board, stopping once limit are found."""
+    return DancingLinks(cells).run(limit)
+
+
+def solve_cells(cells, engine="backtrack", strategies=(), options=None):
+    """
+    Solve a row-major list of ints with the chosen engine, returning the solved list or None.
+    options are passed on to BitboardSudoku (varOrder, valueOrder, recheck).
+    """
+    if engine == "dlx":
+        return DancingLinks(cells).solve(cells)
+    return BitboardSudoku(cells, strategies, **(options or {})).solve()
+
+
+def is_separated(text):
+    return " " in text or "," in text or "\t" in text
+
+
+def parse_cells(text):
+    """
+    Parse a board of any size into a row-major list of ints, 0 for empty.
+    Values are either one character per cell (1-9, then A-Z for 10 and up,
+    0 or . for empty) or separated by whitespace or commas, which can
+    spell out any value.
+    """
+    text = text.strip()
+    if is_separated(text):
+        cells = [0 if token == "." else int(token) for token in text.replace(",", " ").split()]
+    else:
+        cells = [0 if ch in ".0" else int(ch, 36) for ch in text]
+    geometry = geometry_for(len(cells))
+    if max(cells) > geometry.size:
+        raise ValueError("Value %d does not fit a %dx%d board" % (max(cells), geometry.size, geometry.size))
+    if min(cells) < 0:
+        raise ValueError("Value %d is negative" % min(cells))
+    return cells
+
+
+def format_cells(cells, separated=False):
+    """The inverse of parse_cells, one character per cell unless separated is set."""
+    if separated:
+        return " ".join(map(str, cells))
+    return "".join("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[v] for v in cells)
+
+
+def board_to_cells(board):
+    """Convert a board dictionary to a row-major list of 81 ints."""
+    return [board[key] for key in KEYS]
+
+
+def cells_to_board(cells):
+    """Convert a row-major list of 81 ints back to a board dictionary."""
+    return {key: cells[i] for i, key in enumerate(KEYS)}
+
+
+def parse_strategies(text):
+    """Turn a comma separated list (or 'all' / 'none') into strategy names."""
+    if not text or text == "none":
+        return []
+    if text == "all":
+        return list(STRATEGIES)
+    names = text.split(",")
+    for name in names:
+        if name not in STRATEGIES:
+            raise ValueError("Unknown propagation strategy %s" % name)
+    return names
+
+
+def backtracking(board, strategies=()):
+    """Takes a board and returns solved board."""
+    solved = BitboardSudoku(board_to_cells(board), strategies).solve()
+    if solved is None:
+        return None
+    return cells_to_board(solved)
+
+
+def print_strategy_stats(strategyStats):
+    """Print the calls, trail changes and time spent per propagation strategy."""
+    for name, stats in strategyStats.items():
+        print("%-15s calls %8d  changes %8d  time %.4f s" % (name, stats["calls"], stats["changes"], stats["time"]))
+
 
 def compute_statistics(times):
     n = len(times)
@@ -207,77 +770,687 @@ def compute_statistics(times):
     return min(times), max(times), mean, std_dev
 
 
+# Benchmarking
+
+# Curated corpora, every board has exactly one solution
+BENCH_CORPORA = {
+    "easy": [
+        "003020600900305001001806400008102900700000008006708200002609500800203009005010300",
+        "200080300060070084030500209000105408000000000402706000301007040720040060004010003",
+        "000000907000420180000705026100904000050000040000507009920108000034059000507000000",
+        "030050040008010500460000012070502080000603000040109030250000098001020600080060020",
+    ],
+    "hard": [
+        "800000000003600000070090200050007000000045700000100030001000068008500010090000400",
+        "400000805030000000000700000020000060000080400000010000000603070500200000104000000",
+        "100000002090400050006000700050903000000070000000850040700000600030009080002000001",
+        "100007090030020008009600500005300900010080002600004000300000010040000007007000300",
+    ],
+    "17clue": [
+        "000000010400000000020000000000050407008000300001090000300400200050100000000806000",
+        "000000010400000000020000000000050604008000300001090000300400200050100000000807000",
+        "000000012000035000000600070700000300000400800100000000000120000080000040050000600",
+        "000000012003600000000007000410020000000500300700000600280000040000300500000000000",
+        "520006000000000701300000000000400800600000050000000000041800000000030020008700000",
+    ],
+}
+
+
+def load_corpus(name):
+    """A corpus from BENCH_CORPORA by name, or the boards of a file path."""
+    if name in BENCH_CORPORA:
+        return BENCH_CORPORA[name]
+    with open(name) as src:
+        return list(read_boards(src))
+
+
+def percentiles(values):
+    """Nearest-rank p50/p95/p99 plus max and mean of a list of numbers."""
+    ordered = sorted(values)
+    n = len(ordered)
+    rank = lambda p: ordered[min(n - 1, max(0, -(-p * n // 100) - 1))]
+    low, high, mean, std = compute_statistics(ordered)
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99), "max": high, "mean": mean}
+
+
+def benchmark(boards, engine="backtrack", strategies=(), repeat=1, options=None):
+    """
+    Time every board with perf_counter_ns, keeping the fastest of repeat runs.
+    :return list of {"board", "ns", "nodes", "backtracks"} per board
+    """
+    results = []
+    for line in boards:
+        cells = parse_cells(line)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            if engine == "dlx":
+                solver = DancingLinks(cells)
+                solved = solver.solve(cells)
+            else:
+                solver = BitboardSudoku(cells, strategies, **(options or {}))
+                solved = solver.solve()
+            elapsed = time.perf_counter_ns() - start
+            if solved is None:
+                raise ValueError("Benchmark board has no solution: %s" % line)
+            if best is None or elapsed < best:
+                best = elapsed
+        results.append({"board": line, "ns": best, "nodes": solver.nodes, "backtracks": solver.backtracks})
+    return results
+
+
+def run_benchmark(corpora, engine="backtrack", strategies=(), repeat=1, options=None):
+    """:return a JSON-ready report with percentiles of time, nodes and backtracks per corpus"""
+    report = {"engine": engine, "propagate": list(strategies), "options": dict(options or {}),
+              "repeat": repeat, "corpora": {}}
+    for name in corpora:
+        results = benchmark(load_corpus(name), engine, strategies, repeat, options)
+        report["corpora"][name] = {
+            "boards": len(results),
+            "ns": percentiles([r["ns"] for r in results]),
+            "nodes": percentiles([r["nodes"] for r in results]),
+            "backtracks": percentiles([r["backtracks"] for r in results]),
+            "results": results,
+        }
+    return report
+
+
+# settings a baseline must share with the report it is compared against
+BENCH_SETTINGS = ("engine", "propagate", "options")
+
+
+def settings_differences(report, baseline):
+    """:return a message per benchmark setting that differs between the two reports"""
+    return ["%s %s -> %s" % (key, baseline.get(key, {} if key == "options" else None), report[key])
+            for key in BENCH_SETTINGS if report[key] != baseline.get(key, {} if key == "options" else None)]
+
+
+def find_regressions(report, baseline, tolerance=0.10, floorNs=1000000):
+    """
+    Compare a report against a stored one run with the same settings. The
+    search is deterministic, so any growth in a corpus' total or largest
+    node or backtrack count is a regression. Times of a few fast boards are
+    noisy, so only the corpus total and median time count, and only when
+    they grew by more than tolerance and by more than floorNs.
+    :return list of messages, empty when nothing regressed
+    :raise ValueError when the reports were run with different settings
+    """
+    differences = settings_differences(report, baseline)
+    if differences:
+        raise ValueError("baseline was run with different settings: " + "; ".join(differences))
+
+    def change(old, new):
+        return "%s -> %s (%+.1f%%)" % (old, new, 100.0 * (new - old) / old if old else float("inf"))
+
+    regressions = []
+    for name, current in report["corpora"].items():
+        previous = baseline["corpora"].get(name)
+        if previous is None:
+            continue
+        for metric in ("nodes", "backtracks"):
+            old = sum(r[metric] for r in previous["results"])
+            new = sum(r[metric] for r in current["results"])
+            if new > old:
+                regressions.append("%s %s total: %s" % (name, metric, change(old, new)))
+            old, new = previous[metric]["max"], current[metric]["max"]
+            if new > old:
+                regressions.append("%s %s max: %s" % (name, metric, change(old, new)))
+        times = (("total", sum(r["ns"] for r in previous["results"]), sum(r["ns"] for r in current["results"])),
+                 ("p50", previous["ns"]["p50"], current["ns"]["p50"]))
+        for key, old, new in times:
+            if new > old * (1 + tolerance) and new - old > floorNs:
+                regressions.append("%s ns %s: %s" % (name, key, change(old, new)))
+    return regressions
+
+
+def compare_orderings(corpora, strategies=(), repeat=1):
+    """:return one backtracking report per combination of variable order, value order and recheck"""
+    return [run_benchmark(corpora, "backtrack", strategies, repeat,
+                          {"varOrder": varOrder, "valueOrder": valueOrder, "recheck": recheck})
+            for varOrder in VAR_ORDERS for valueOrder in VALUE_ORDERS for recheck in (True, False)]
+
+
+def print_orderings(reports):
+    print("%-10s %-8s %-8s %-10s %9s %9s %10s %10s" % ("variables", "values", "recheck", "corpus",
+                                                       "nodes", "max nodes", "ms p50", "ms total"))
+    for report in reports:
+        options = report["options"]
+        for name, corpus in report["corpora"].items():
+            print("%-10s %-8s %-8s %-10s %9d %9d %10.3f %10.3f"
+                  % (options["varOrder"], options["valueOrder"], options["recheck"], name,
+                     sum(r["nodes"] for r in corpus["results"]), corpus["nodes"]["max"],
+                     corpus["ns"]["p50"] / 1e6, sum(r["ns"] for r in corpus["results"]) / 1e6))
+
+
+def print_benchmark(report):
+    print("engine %s  propagate %s" % (report["engine"], ",".join(report["propagate"]) or "none"))
+    for name, corpus in report["corpora"].items():
+        ns, nodes = corpus["ns"], corpus["nodes"]
+        print("%-10s %3d boards  ms p50 %8.3f p95 %8.3f p99 %8.3f max %8.3f  nodes p50 %7d max %7d"
+              % (name, corpus["boards"], ns["p50"] / 1e6, ns["p95"] / 1e6, ns["p99"] / 1e6, ns["max"] / 1e6,
+                 nodes["p50"], nodes["max"]))
+
+
+# Vectorized Propagation
+
+def propagate_batch(boards, geometry):
+    """
+    Naked and hidden singles for many boards of one geometry at once with
+    NumPy. Candidates are the same size-bit masks BitboardSudoku uses, kept
+    in an (N, cells) array, so a round is a handful of whole-array
+    operations over the unit index arrays. Boards drop out of the loop as
+    soon as a round leaves them unchanged.
+    :param boards: list of row-major cell lists, 0 for empty
+    :return (candidates, dead) where dead[b] is set for a board with a contradiction
+    """
+    geo = geometry
+    size = geo.size
+    # rows, columns and boxes, each group covering every cell exactly once
+    groups = np.array(geo.units).reshape(3, size, size)
+    unitOf = np.array([geo.rowOf, geo.colOf, geo.boxOf])
+    givens = np.array(boards, dtype=np.int64)
+    cand = np.where(givens > 0, np.left_shift(1, givens - 1), geo.allValues).astype(np.int64)
+    active = np.arange(len(cand))
+    while len(active):
+        sub = cand[active]
+        single = np.where(sub & (sub - 1) == 0, sub, 0)
+        # naked singles: the values fixed in a cell's units leave its candidates
+        used = 0
+        for group, of in zip(groups, unitOf):
+            used = used | np.bitwise_or.reduce(single[:, group], axis=2)[:, of]
+        new = np.where(single > 0, sub, sub & ~used)
+        # hidden singles: a value with one place left in a unit is fixed there
+        for group, of in zip(groups, unitOf):
+            inUnit = new[:, group]
+            once = twice = 0
+            for pos in range(size):
+                twice = twice | (once & inUnit[:, :, pos])
+                once = once | inUnit[:, :, pos]
+            hidden = new & (once & ~twice)[:, of]
+            new = np.where(hidden > 0, hidden, new)
+        changed = (new != sub).any(axis=1)
+        cand[active] = new
+        active = active[changed]
+
+    # a wiped out cell, a value with no place left in a unit or the same value fixed twice in a unit
+    dead = (cand == 0).any(axis=1)
+    single = np.where(cand & (cand - 1) == 0, cand, 0)
+    for group in groups:
+        dead |= (np.bitwise_or.reduce(cand[:, group], axis=2) != geo.allValues).any(axis=1)
+        dead |= (single[:, group].sum(axis=2) != np.bitwise_or.reduce(single[:, group], axis=2)).any(axis=1)
+    return cand, dead
+
+
+def batch_givens(cand, dead):
+    """
+    Read the propagated candidates back as boards.
+    :return list of (cells with every single filled in, finished) or None for a dead board
+    """
+    isSingle = cand & (cand - 1) == 0
+    fixed = np.where(isSingle, np.log2(np.maximum(cand, 1)).astype(np.int64) + 1, 0)
+    finished = isSingle.all(axis=1)
+    return [None if dead[b] else (fixed[b].tolist(), bool(finished[b])) for b in range(len(cand))]
+
+
+# Batch Solving
+
+_WORKER = {}
+
+
+def _init_worker(engine, strategies, count, vectorize=False, options=None):
+    _WORKER.update(engine=engine, strategies=strategies, count=count, vectorize=vectorize, options=options or {})
+
+
+# what became of each board line in a batch
+BATCH_OUTCOMES = ("solved", "unsolvable", "invalid", "error")
+
+
+def solve_chunk(lines):
+    """
+    Solve a chunk of board lines in a worker. Solutions are written in the
+    format of their input line. With vectorize the whole chunk is first
+    propagated with NumPy and only the boards left unfinished are searched.
+    :return (output lines, strategy statistics summed over the chunk,
+             boards per outcome in BATCH_OUTCOMES)
+    """
+    engine, strategies, count = _WORKER["engine"], _WORKER["strategies"], _WORKER["count"]
+    totals = {name: {"calls": 0, "changes": 0, "time": 0.0} for name in strategies}
+    parsed = []
+    for line in lines:
+        try:
+            parsed.append(parse_cells(line))
+        except ValueError:
+            parsed.append(None)
+
+    # per board: (cells to search from, finished), or None once propagation found a contradiction
+    starts = [(cells, False) for cells in parsed]
+    if _WORKER["vectorize"]:
+        start = time.perf_counter()
+        bySize = {}
+        for k, cells in enumerate(parsed):
+            if cells is not None:
+                bySize.setdefault(len(cells), []).append(k)
+        for n, indices in bySize.items():
+            cand, dead = propagate_batch([parsed[k] for k in indices], geometry_for(n))
+            for k, given in zip(indices, batch_givens(cand, dead)):
+                starts[k] = given
+        totals["numpy_batch"] = {"calls": len(lines),
+                                 "changes": sum(1 for given in starts if given and given[1]),
+                                 "time": time.perf_counter() - start}
+
+    out = []
+    counts = dict.fromkeys(BATCH_OUTCOMES, 0)
+    for line, cells, given in zip(lines, parsed, starts):
+        if cells is None:
+            out.append(line + " invalid")
+            counts["invalid"] += 1
+            continue
+        if given is None:
+            solved = None
+        elif given[1]:
+            solved = given[0]
+        elif engine == "dlx":
+            solved = DancingLinks(given[0]).solve(given[0])
+        else:
+            solver = BitboardSudoku(given[0], strategies, **_WORKER["options"])
+            solved = solver.solve()
+            for name, stats in solver.strategyStats.items():
+                for key in stats:
+                    totals[name][key] += stats[key]
+        text = format_cells(solved, is_separated(line)) if solved is not None else line + " unsolvable"
+        counts["solved" if solved is not None else "unsolvable"] += 1
+        if count:
+            text += " %d" % count_solutions(cells)
+        out.append(text)
+    return out, totals, counts
+
+
+def read_boards(source):
+    """Lazily yield the board lines of a file, skipping blank lines."""
+    for line in source:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def run_batch(source, output, engine="backtrack", strategies=(), workers=None, chunkSize=256, count=False,
+              vectorize=False, options=None):
+    """
+    Stream boards from source to output through a process pool. Boards are
+    sent in chunks, at most a few chunks per worker are in flight so memory
+    stays flat however long the input is, and finished chunks wait in a
+    reorder buffer until every earlier chunk has been written. vectorize
+    runs NumPy propagation over each chunk before any per-board search.
+    :return (boards per outcome in BATCH_OUTCOMES, seconds, summed strategy statistics)
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = {name: {"calls": 0, "changes": 0, "time": 0.0} for name in strategies}
+    boards = read_boards(source)
+    chunks = iter(lambda: list(islice(boards, chunkSize)), [])
+    outcomes = dict.fromkeys(BATCH_OUTCOMES, 0)
+    start = time.perf_counter()
+
+    def emit(result):
+        lines, stats, counts = result
+        output.write("\n".join(lines))
+        output.write("\n")
+        for name, values in stats.items():
+            total = totals.setdefault(name, dict.fromkeys(values, 0))
+            for key in values:
+                total[key] += values[key]
+        for outcome in counts:
+            outcomes[outcome] += counts[outcome]
+
+    if workers == 1:
+        _init_worker(engine, strategies, count, vectorize, options)
+        for chunk in chunks:
+            emit(solve_chunk(chunk))
+        return outcomes, time.perf_counter() - start, totals
+
+    def new_pool():
+        return ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(engine, strategies, count, vectorize, options))
+
+    def chunk_error(number, chunk, error):
+        """the result of a chunk that raised: every line reported as an error"""
+        print("Chunk %d failed: %s: %s" % (number, type(error).__name__, error), file=sys.stderr)
+        return [line + " error" for line in chunk], {}, {"error": len(chunk)}
+
+    pool = new_pool()
+
+    def submit(chunk):
+        nonlocal pool
+        try:
+            return pool.submit(solve_chunk, chunk)
+        except BrokenExecutor:
+            pool.shutdown()
+            pool = new_pool()
+            return pool.submit(solve_chunk, chunk)
+
+    try:
+        # future -> (chunk number, chunk lines)
+        pending = {}
+        ready = {}
+        submitted = written = 0
+        # chunks submitted but not yet written, counting those waiting in the reorder buffer,
+        # so a slow chunk holds up new work instead of letting the buffer grow
+        window = workers * 4
+        exhausted = False
+        while True:
+            while not exhausted and submitted - written < window:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                pending[submit(chunk)] = (submitted, chunk)
+                submitted += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            suspects = []
+            while done:
+                for future in done:
+                    number, chunk = pending.pop(future)
+                    try:
+                        ready[number] = future.result()
+                    except BrokenExecutor:
+                        suspects.append((number, chunk))
+                    except Exception as error:
+                        ready[number] = chunk_error(number, chunk, error)
+                # a worker killed mid-chunk (e.g. by the OOM killer) fails every chunk in flight
+                # with it, so let the rest of them fail too before sorting out which one it was
+                done = wait(pending)[0] if suspects else ()
+            # alone on a fresh pool only the chunk that killed the worker fails again
+            for number, chunk in suspects:
+                try:
+                    ready[number] = submit(chunk).result()
+                except Exception as error:
+                    ready[number] = chunk_error(number, chunk, error)
+            while written in ready:
+                emit(ready.pop(written))
+                written += 1
+    finally:
+        pool.shutdown()
+    return outcomes, time.perf_counter() - start, totals
+
+
+# Puzzle Generation
+
+# Difficulty levels, each with the propagation that must solve a puzzle without search
+DIFFICULTY_LEVELS = [
+    ("easy", ["naked_singles"]),
+    ("medium", ["naked_singles", "hidden_singles"]),
+    ("hard", ["naked_singles", "hidden_singles", "pointing", "box_line", "naked_pairs", "hidden_pairs"]),
+    ("expert", list(STRATEGIES)),
+]
+
+
+# search nodes a uniqueness check may use before the clue is kept anyway, and its propagation:
+# singles are cheapest on 9x9, larger boards need the box / line reductions as well
+DIG_NODE_LIMIT = 500
+DIG_STRATEGIES = ("naked_singles", "hidden_singles")
+DIG_STRATEGIES_LARGE = ("naked_singles", "hidden_singles", "pointing", "box_line")
+
+
+def random_grid(rng, geometry):
+    """
+    A random complete grid. The boxes on the diagonal share no unit, so they
+    are filled with shuffled values and search completes the rest.
+    """
+    geo = geometry
+    cells = [0] * geo.cells
+    for b in range(0, geo.size, geo.box + 1):
+        values = list(range(1, geo.size + 1))
+        rng.shuffle(values)
+        for i, num in zip(geo.units[2 * geo.size + b], values):
+            cells[i] = num
+    return BitboardSudoku(cells, ("naked_singles", "hidden_singles"), geo).solve()
+
+
+def has_other_solution(cells, i, num, strategies=DIG_STRATEGIES, nodeLimit=DIG_NODE_LIMIT):
+    """
+    True when the board can be solved with cell i holding anything but num.
+    If the board was unique with num in cell i, this is the count-to-two
+    uniqueness check after clearing it, with the known solution ruled out
+    up front so a single solve answers it. A search that needs more than
+    nodeLimit nodes counts as another solution, so the clue is kept.
+    """
+    board = list(cells)
+    board[i] = 0
+    solver = BitboardSudoku(board, strategies)
+    solver.nodeLimit = nodeLimit
+    try:
+        return solver.consistent and solver.eliminate(i, 1 << (num - 1)) and solver.solve() is not None
+    except SearchLimit:
+        return True
+
+
+def dig_holes(rng, grid, geometry, symmetric=False):
+    """
+    Clear the cells of a complete grid in random order, keeping a cell
+    cleared only while the puzzle still has a unique solution.
+    :param symmetric: clear cells in pairs mirrored through the centre
+    """
+    cells = list(grid)
+    strategies = DIG_STRATEGIES if geometry.size <= 9 else DIG_STRATEGIES_LARGE
+    order = list(range(geometry.cells))
+    rng.shuffle(order)
+    for i in order:
+        group = {i, geometry.cells - 1 - i} if symmetric else {i}
+        removed = [(j, cells[j]) for j in group if cells[j]]
+        if not removed:
+            continue
+        for j, num in removed:
+            cells[j] = 0
+        # a second solution has to differ in one of the cells just cleared
+        if any(has_other_solution(cells, j, num, strategies) for j, num in removed):
+            for j, num in removed:
+                cells[j] = num
+    return cells
+
+
+def rate_puzzle(cells):
+    """
+    :return (difficulty, nodes): the first of DIFFICULTY_LEVELS whose propagation
+        solves the puzzle without search, or "extreme" together with the
+        search nodes it needs with every strategy
+    """
+    for name, strategies in DIFFICULTY_LEVELS:
+        solver = BitboardSudoku(cells, strategies)
+        # the first search node already means propagation was not enough
+        solver.nodeLimit = 1
+        try:
+            solver.solve()
+            return name, 0
+        except SearchLimit:
+            pass
+    solver = BitboardSudoku(cells, DIFFICULTY_LEVELS[-1][1])
+    solver.solve()
+    return "extreme", solver.nodes
+
+
+def generate_puzzle(seed, index, box=3, symmetric=False):
+    """
+    Puzzle number index of a run. Every puzzle has its own generator seeded
+    from (seed, index), so a run gives the same puzzles however it is split
+    across processes.
+    :return (cells, difficulty, nodes)
+    """
+    rng = random.Random("%s:%d" % (seed, index))
+    geometry = get_geometry(box)
+    puzzle = dig_holes(rng, random_grid(rng, geometry), geometry, symmetric)
+    difficulty, nodes = rate_puzzle(puzzle)
+    return puzzle, difficulty, nodes
+
+
+def _generate_line(job):
+    seed, index, box, symmetric = job
+    puzzle, difficulty, nodes = generate_puzzle(seed, index, box, symmetric)
+    return "%s %s %d" % (format_cells(puzzle), difficulty, nodes)
+
+
+def generate_puzzles(count, seed=0, box=3, symmetric=False, workers=None):
+    """Lazily yield count lines of 'puzzle difficulty nodes', in index order, generated by a process pool."""
+    workers = workers or os.cpu_count() or 1
+    jobs = ((seed, index, box, symmetric) for index in range(count))
+    if workers == 1:
+        for job in jobs:
+            yield _generate_line(job)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        for line in pool.map(_generate_line, jobs, chunksize=max(1, min(64, count // (workers * 4)))):
+            yield line
+
+
 if __name__ == '__main__':
-    times = []
-    if len(sys.argv) > 1:
-        
-        # Running sudoku solver with one board $python3 sudoku.py <input_string>.
-        print(sys.argv[1])
-        # Parse boards to dict representation, scanning board L to R, Up to Down
-        board = { ROW[r] + COL[c]: int(sys.argv[1][9*r+c])
-                  for r in range(9) for c in range(9)}       
-        
-        start_time = time.time()
-        solved_board = backtracking(board)
-        end_time = time.time()
-        
-        runtime = end_time - start_time
-        times.append(runtime)
-        # Write board to file
-        out_filename = 'output.txt'
-        outfile = open(out_filename, "w")
-        outfile.write(board_to_string(solved_board))
-        outfile.write('\n')
+    parser = argparse.ArgumentParser(description="Solve sudoku boards with backtracking search.")
+    parser.add_argument("board", nargs="?",
+                        help="cells scanned left to right, top to bottom, 0 for empty: one character each "
+                             "(1-9, A-Z for 10 and up) or space / comma separated numbers, for 9x9, 16x16, 25x25 ...")
+    parser.add_argument("--propagate", default="none",
+                        help="comma separated strategies from %s, or all / none" % ", ".join(STRATEGIES))
+    parser.add_argument("--stats", action="store_true", help="print per-strategy propagation statistics")
+    parser.add_argument("--engine", choices=["backtrack", "dlx"], default="backtrack",
+                        help="backtracking search or the dancing links exact cover solver")
+    parser.add_argument("--count", action="store_true",
+                        help="print how many solutions each board has, stopping at 2")
+    parser.add_argument("--input", default="sudokus_start.txt", help="boards to solve, one per line, - for stdin")
+    parser.add_argument("--output", default="output.txt", help="where solved boards are written, - for stdout")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for the batch (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="boards sent to a worker at a time")
+    parser.add_argument("--vectorize", action="store_true",
+                        help="propagate each chunk with NumPy and only search the boards left unsolved "
+                             "(use a larger --chunk-size, e.g. 4096)")
+    parser.add_argument("--bench", metavar="CORPORA",
+                        help="benchmark comma separated corpora (%s, all, or file paths)" % ", ".join(BENCH_CORPORA))
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark board, the fastest is kept")
+    parser.add_argument("--json", help="write the benchmark report to this file")
+    parser.add_argument("--baseline", help="benchmark report to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before a regression is flagged")
+    parser.add_argument("--noise-floor", type=float, default=1.0,
+                        help="milliseconds a corpus time must also grow by before it is flagged")
+    parser.add_argument("--var-order", choices=VAR_ORDERS, default="mrv",
+                        help="full MRV scan, incremental MRV, or incremental MRV with a degree tie-break")
+    parser.add_argument("--value-order", choices=VALUE_ORDERS, default="natural",
+                        help="ascending values or least constraining value first")
+    parser.add_argument("--skip-recheck", action="store_true",
+                        help="trust forward checking instead of re-validating every value before assigning it")
+    parser.add_argument("--bench-orderings", action="store_true",
+                        help="with --bench, compare every variable order / value order / recheck combination")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="write N new unique puzzles with their difficulty and search nodes to --output")
+    parser.add_argument("--seed", default="0", help="seed for --generate, the same seed gives the same puzzles")
+    parser.add_argument("--box", type=int, default=3, help="box size of generated puzzles, 3 for 9x9, 4 for 16x16")
+    parser.add_argument("--symmetric", action="store_true", help="generate puzzles with rotationally symmetric clues")
+    args = parser.parse_args()
+    if args.vectorize and np is None:
+        parser.error("--vectorize needs numpy")
+    strategies = parse_strategies(args.propagate)
+    strategyStats = {name: {"calls": 0, "changes": 0, "time": 0.0} for name in strategies}
+    options = {"varOrder": args.var_order, "valueOrder": args.value_order, "recheck": not args.skip_recheck}
 
-    else:
-        # Running sudoku solver for boards in sudokus_start.txt $python3 sudoku.py
+    def solve_with_stats(cells):
+        if args.count:
+            print("solutions: %s" % {0: "0", 1: "1", 2: "2 or more"}[count_solutions(cells)])
+        if args.engine == "dlx":
+            return solve_cells(cells, "dlx")
+        solver = BitboardSudoku(cells, strategies, **options)
+        solved = solver.solve()
+        for name, stats in solver.strategyStats.items():
+            for key in stats:
+                strategyStats[name][key] += stats[key]
+        return solved
 
-        #  Read boards from source.
-        src_filename = 'sudokus_start.txt'
+    if args.generate:
+        start_time = time.perf_counter()
+        outfile = sys.stdout if args.output == "-" else open(args.output, "w")
         try:
-            srcfile = open(src_filename, "r")
-            sudoku_list = srcfile.read()
-        except:
-            print("Error reading the sudoku file %s" % src_filename)
-            exit()
+            for line in generate_puzzles(args.generate, args.seed, args.box, args.symmetric, args.workers):
+                outfile.write(line)
+                outfile.write("\n")
+        finally:
+            if outfile is not sys.stdout:
+                outfile.close()
+        elapsed = time.perf_counter() - start_time
+        print("Generated %d puzzles in %.3f s (%.1f puzzles/s)" % (args.generate, elapsed, args.generate / elapsed),
+              file=sys.stderr)
 
-        # Setup output file
-        out_filename = 'output.txt'
-        outfile = open(out_filename, "w")
+    elif args.bench and args.bench_orderings:
+        corpora = list(BENCH_CORPORA) if args.bench == "all" else args.bench.split(",")
+        reports = compare_orderings(corpora, strategies, args.repeat)
+        print_orderings(reports)
+        if args.json:
+            with open(args.json, "w") as out:
+                json.dump(reports, out, indent=1)
 
-        # Solve each board using backtracking
-        for line in sudoku_list.split("\n"):
+    elif args.bench:
+        corpora = list(BENCH_CORPORA) if args.bench == "all" else args.bench.split(",")
+        report = run_benchmark(corpora, args.engine, strategies, args.repeat, options)
+        print_benchmark(report)
+        if args.json:
+            with open(args.json, "w") as out:
+                json.dump(report, out, indent=1)
+        if args.baseline:
+            with open(args.baseline) as src:
+                baseline = json.load(src)
+            try:
+                regressions = find_regressions(report, baseline, args.tolerance, int(args.noise_floor * 1e6))
+            except ValueError as error:
+                print("Cannot compare against %s: %s" % (args.baseline, error))
+                sys.exit(2)
+            for message in regressions:
+                print("REGRESSION " + message)
+            if regressions:
+                sys.exit(1)
+            print("No regressions against %s" % args.baseline)
 
-            if len(line) < 9:
-                continue
+    elif args.board:
+        
+        # Running sudoku solver with one board $python3 sudoku.py <input_string>.
+        print(args.board)
+        # Parse the board to a list of cells, scanning board L to R, Up to Down
+        try:
+            cells = parse_cells(args.board)
+        except ValueError as e:
+            print("Invalid board: %s" % e)
+            sys.exit(1)
+
+        start_time = time.perf_counter_ns()
+        solved = solve_with_stats(cells)
+        print("Solved in %.3f ms" % ((time.perf_counter_ns() - start_time) / 1e6), file=sys.stderr)
+        text = format_cells(solved, is_separated(args.board)) if solved is not None else "unsolvable"
+
+        # Write board to file
+        if args.output == "-":
+            print(text)
+        else:
+            with open(args.output, "w") as outfile:
+                outfile.write(text)
+                outfile.write('\n')
+
+    else:
+        # Running sudoku solver for boards in a file $python3 sudoku.py [--input boards.txt]
+        try:
+            srcfile = sys.stdin if args.input == "-" else open(args.input, "r")
+        except OSError:
+            print("Error reading the sudoku file %s" % args.input)
+            sys.exit(1)
+        outfile = sys.stdout if args.output == "-" else open(args.output, "w")
+        try:
+            outcomes, elapsed, batchStats = run_batch(srcfile, outfile, args.engine, strategies,
+                                                      args.workers, args.chunk_size, args.count, args.vectorize,
+                                                      options)
+        finally:
+            if srcfile is not sys.stdin:
+                srcfile.close()
+            if outfile is not sys.stdout:
+                outfile.close()
+        strategyStats = batchStats
+        boards = sum(outcomes.values())
+        print("Processed %d boards in %.3f s (%.1f boards/s): %s"
+              % (boards, elapsed, boards / elapsed if elapsed else 0.0,
+                 ", ".join("%d %s" % (outcomes[outcome], outcome) for outcome in BATCH_OUTCOMES)),
+              file=sys.stderr)
 
-            # Parse boards to dict representation, scanning board L to R, Up to Down
-            board = { ROW[r] + COL[c]: int(line[9*r+c])
-                      for r in range(9) for c in range(9)}
-
-            # Print starting board. TODO: Comment this out when timing runs.
-            #print_board(board)
-
-            # Solve with backtracking
-            start_time = time.time()
-            solved_board = backtracking(board)
-            end_time = time.time()
-            
-            runtime = end_time - start_time
-            times.append(runtime)
-
-            # Print solved board. TODO: Comment this out when timing runs.
-            #print_board(solved_board)
-
-            # Write board to file
-            outfile.write(board_to_string(solved_board))
-            outfile.write('\n')
-
-        #print("Finishing all boards in file.")
-    
-    #min_time, max_time, mean_time, std_dev_time = compute_statistics(times)
-    #print("\nRunning Time Statistics:")
-    #print(f"Min Time: {min_time:.4f} seconds")
-    #print(f"Max Time: {max_time:.4f} seconds")
-    #print(f"Mean Time: {mean_time:.4f} seconds")
-    #print(f"Standard Deviation: {std_dev_time:.4f} seconds")
\ No newline at end of file
+    if args.stats:
+        print_strategy_stats(strategyStats)
\ No newline at end of file